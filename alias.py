@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+#
+###############################################################################
+#   Copyright (C) 2020 VK2PSF
+#   Copyright (C) 2016-2018 Cortney T. Buffington, N0MJS <n0mjs@me.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+###############################################################################
+
+'''
+ID alias handling for dmrmonitor.py. Every RCM status and bridge event turns
+the same few hundred radio IDs into display strings, so the formatted strings
+are kept in a bounded LRU cache instead of being rebuilt from the alias
+dictionaries each time.
+
+The radioid.net peer and subscriber lists are big enough that holding them as
+Python dictionaries costs hundreds of MB, so they can instead be compiled into
+a sorted binary index that is memory mapped and searched in place.
+'''
+
+import os
+import mmap
+import struct
+from collections import OrderedDict
+
+# Utilities from K0USY Group sister project
+from dmr_utils.utils import get_alias, mk_full_id_dict
+
+# Does anybody read this stuff? There's a PEP somewhere that says I should do this.
+__author__     = 'Alex Stewart, VK2PSF'
+__copyright__  = 'Copyright (c) 2016-2019,2020 VK2PSF ,Cortney T. Buffington, N0MJS and the K0USY Group'
+__credits__    = 'Colin Durbridge, G4EML, Steve Zingman, N4IRS; Mike Zingman, N4IRR; Jonathan Naylor, G4KLX; Hans Barthen, DL5DI; Torsten Shultze, DG1HT'
+__license__    = 'GNU GPLv3'
+__maintainer__ = 'Alex Stewart , N0MJS'
+__email__      = 'vk2psf@arrl.net'
+
+
+# Alias formats: the dictionary fields used, and whether all of them are
+# joined or only the first one is shown
+FORMATS = {
+    'string': (('CALLSIGN', 'CITY', 'STATE'), True),
+    'short':  (('CALLSIGN', 'NAME'), True),
+    'call':   (('CALLSIGN',), False),
+    'tgid':   (('NAME',), False)
+}
+
+
+def format_alias(_id, _dict, _format):
+    _fields, _join = FORMATS[_format]
+    alias = get_alias(_id, _dict, *_fields)
+    if type(alias) == list:
+        if _join:
+            return ', '.join([item for item in alias if item != None])
+        return str(alias[0])
+    # Unknown IDs come back as the number itself, 'string' has always shown it as is
+    if _format == 'string':
+        return alias
+    return str(alias)
+
+
+class alias_resolver(object):
+    '''
+    Formatted aliases keyed by (format, dictionary, id). The dictionary is
+    identified by object identity, which only holds while the dictionaries
+    are unchanged, so invalidate() has to be called whenever they reload.
+    '''
+    def __init__(self, _size):
+        self.size = _size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def resolve(self, _id, _dict, _format):
+        _key = (_format, id(_dict), _id)
+        try:
+            alias = self.cache.pop(_key)
+            self.hits += 1
+        except KeyError:
+            alias = format_alias(_id, _dict, _format)
+            self.misses += 1
+            if len(self.cache) >= self.size:
+                self.cache.popitem(last=False)
+        self.cache[_key] = alias
+        return alias
+
+    def invalidate(self):
+        self.cache.clear()
+
+    def stats(self):
+        _lookups = self.hits + self.misses
+        return {
+            'SIZE': len(self.cache),
+            'HITS': self.hits,
+            'MISSES': self.misses,
+            'HIT_RATE': float(self.hits) / _lookups if _lookups else 0.0
+        }
+
+
+#
+# COMPACT MEMORY MAPPED ALIAS INDEX
+#   Layout, all little endian:
+#     header   magic, record count, signature length, signature
+#     ids      count x uint32, sorted
+#     offsets  (count + 1) x uint32, start of each record in the blob
+#     blob     utf-8 fields in INDEX_FIELDS order, separated by INDEX_SEP,
+#              a field that isn't in the source is stored as INDEX_NONE
+#   The signature records the name, mtime and size of every source file, the
+#   index is only rebuilt when it no longer matches.
+#
+INDEX_MAGIC  = 'DMRAIDX1'
+INDEX_HEADER = struct.Struct('<8sII')
+INDEX_FIELDS = ('CALLSIGN', 'CITY', 'STATE', 'NAME')
+INDEX_SEP    = '\x1f'
+INDEX_NONE   = '\x00'
+UINT32       = struct.Struct('<I')
+
+
+def index_signature(_path, _sources):
+    _signature = []
+    for _file, _type in _sources:
+        try:
+            _stat = os.stat(_path + _file)
+            _signature.append((_file, _stat.st_mtime, _stat.st_size))
+        except OSError:
+            _signature.append((_file, None, None))
+    return repr(_signature)
+
+
+def build_index(_path, _index_file, _sources):
+    # Later sources override earlier ones, same as the local_*_ids files always have
+    _dict = {}
+    for _file, _type in _sources:
+        _dict.update(mk_full_id_dict(_path, _file, _type))
+    _signature = index_signature(_path, _sources)
+
+    _ids = sorted(_dict)
+    _offsets = [0]
+    _blob = []
+    _length = 0
+    for _id in _ids:
+        _fields = []
+        for _field in INDEX_FIELDS:
+            _value = _dict[_id].get(_field)
+            if _value is None:
+                _fields.append(INDEX_NONE)
+            elif isinstance(_value, unicode):
+                _fields.append(_value.encode('utf-8'))
+            else:
+                _fields.append(str(_value))
+        _record = INDEX_SEP.join(_fields)
+        _blob.append(_record)
+        _length += len(_record)
+        _offsets.append(_length)
+
+    # Write beside the live index and rename over it, anything still mapping
+    # the old file keeps its view until it lets go
+    _tmp = _path + _index_file + '.tmp'
+    with open(_tmp, 'wb') as _handle:
+        _handle.write(INDEX_HEADER.pack(INDEX_MAGIC, len(_ids), len(_signature)))
+        _handle.write(_signature)
+        _handle.write(struct.pack('<%dI' % len(_ids), *_ids))
+        _handle.write(struct.pack('<%dI' % len(_offsets), *_offsets))
+        _handle.write(''.join(_blob))
+    os.rename(_tmp, _path + _index_file)
+    return len(_ids)
+
+
+class alias_index(object):
+    '''
+    Read-only, dictionary-like view of an index file: supports "in", [] and
+    len() so dmr_utils get_alias() can use it in place of an alias dictionary.
+    Records come back as dictionaries of INDEX_FIELDS.
+    '''
+    def __init__(self, _file):
+        with open(_file, 'rb') as _handle:
+            self.map = mmap.mmap(_handle.fileno(), 0, access=mmap.ACCESS_READ)
+        _magic, self.count, _siglen = INDEX_HEADER.unpack_from(self.map, 0)
+        if _magic != INDEX_MAGIC:
+            raise ValueError('{} is not an alias index'.format(_file))
+        self.signature = self.map[INDEX_HEADER.size:INDEX_HEADER.size + _siglen]
+        self.ids = INDEX_HEADER.size + _siglen
+        self.offsets = self.ids + 4 * self.count
+        self.blob = self.offsets + 4 * (self.count + 1)
+
+    def find(self, _id):
+        _low, _high = 0, self.count - 1
+        while _low <= _high:
+            _mid = (_low + _high) // 2
+            _found = UINT32.unpack_from(self.map, self.ids + 4 * _mid)[0]
+            if _found < _id:
+                _low = _mid + 1
+            elif _found > _id:
+                _high = _mid - 1
+            else:
+                return _mid
+        return -1
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, _id):
+        return self.find(_id) >= 0
+
+    def __getitem__(self, _id):
+        _pos = self.find(_id)
+        if _pos < 0:
+            raise KeyError(_id)
+        _start = UINT32.unpack_from(self.map, self.offsets + 4 * _pos)[0]
+        _end = UINT32.unpack_from(self.map, self.offsets + 4 * _pos + 4)[0]
+        _record = {}
+        for _field, _value in zip(INDEX_FIELDS, self.map[self.blob + _start:self.blob + _end].split(INDEX_SEP)):
+            _record[_field] = None if _value == INDEX_NONE else _value.decode('utf-8')
+        return _record
+
+    def get(self, _id, _default=None):
+        try:
+            return self[_id]
+        except KeyError:
+            return _default
+
+
+def load_index(_path, _index_file, _sources):
+    try:
+        _index = alias_index(_path + _index_file)
+        if _index.signature == index_signature(_path, _sources):
+            return _index, False
+    except (IOError, ValueError, struct.error, mmap.error):
+        pass
+    build_index(_path, _index_file, _sources)
+    return alias_index(_path + _index_file), True
@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+#
+###############################################################################
+#   Copyright (C) 2020 VK2PSF
+#   Copyright (C) 2016-2018 Cortney T. Buffington, N0MJS <n0mjs@me.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+###############################################################################
+
+'''
+Checks that dmrmonitor.py doesn't wait on the alias downloads, no DMRlink or
+internet connection needed.
+
+The alias files are served from a local web server that sleeps --delay
+seconds before answering each request, and the fake DMRlink from benchmark.py
+sends dmrmonitor.py a small network. While the downloads are still
+outstanding the web page has to load and the DMRlink table has to reach a
+websocket client showing raw peer IDs; once they finish the table has to be
+sent again with the aliases in it.
+
+    python alias_check.py --delay 5
+
+Prints what it saw as JSON and exits 1 if any of that didn't happen.
+'''
+
+from __future__ import print_function
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import base64
+import tempfile
+import threading
+import subprocess
+import SocketServer
+import SimpleHTTPServer
+from time import time, sleep
+
+from twisted.internet import reactor
+from twisted.web.client import Agent, readBody
+from twisted.web.http_headers import Headers
+from autobahn.twisted.websocket import WebSocketClientProtocol, WebSocketClientFactory
+
+from dmr_utils.utils import int_id
+
+from benchmark import mk_network, traffic_source
+
+# Does anybody read this stuff? There's a PEP somewhere that says I should do this.
+__author__     = 'Alex Stewart, VK2PSF'
+__copyright__  = 'Copyright (c) 2016-2019,2020 VK2PSF ,Cortney T. Buffington, N0MJS and the K0USY Group'
+__credits__    = 'Colin Durbridge, G4EML, Steve Zingman, N4IRS; Mike Zingman, N4IRR; Jonathan Naylor, G4KLX; Hans Barthen, DL5DI; Torsten Shultze, DG1HT'
+__license__    = 'GNU GPLv3'
+__maintainer__ = 'Alex Stewart , N0MJS'
+__email__      = 'vk2psf@arrl.net'
+
+
+MONITOR_CONFIG = '''[GLOBAL]
+REPORT_NAME: alias check
+CONFIG_INC: True
+BRIDGES_INC: True
+DMRLINK_IP: 127.0.0.1
+DMRLINK_PORT: {dmrlink_port}
+FREQUENCY: 10
+STALL_THRESHOLD: 0
+
+[WEBSITE]
+PATH: {path}/
+WEB_SERVER_PORT: {web_port}
+WEBSERVICE_PORT: {ws_port}
+CLIENT_TIMEOUT: 0
+WEB_AUTH: False
+WEB_USER: dmrmon
+WEB_PASS: dmrmon
+
+[LOGGER]
+LOG_FILE: {tmp}/dmrmonitor.log
+LOG_HANDLERS: file
+LOG_LEVEL: INFO
+LOG_NAME: dmrmonitor
+LOG_LASTHEARD:
+
+[ALIASES]
+TRY_DOWNLOAD: True
+PATH: {tmp}/
+PEER_FILE: peer_ids.json
+SUBSCRIBER_FILE: subscriber_ids.json
+TGID_FILE: talkgroup_ids.json
+LOCAL_SUB_FILE: local_subscriber_ids.json
+LOCAL_PEER_FILE: local_peer_ids.json
+PEER_URL: http://127.0.0.1:{http_port}/rptrs.json
+SUBSCRIBER_URL: http://127.0.0.1:{http_port}/users.json
+STALE_DAYS: 7
+INDEX: False
+RELOAD_HOURS: 0
+'''
+
+# What the peers are called once the aliases are in
+CALLSIGN = 'VK0CHK{}'
+
+
+#
+# SLOW ALIAS SERVER
+#
+class slow_handler(SimpleHTTPServer.SimpleHTTPRequestHandler):
+    def translate_path(self, path):
+        return os.path.join(self.server.root, os.path.basename(path.split('?')[0]))
+
+    def do_GET(self):
+        sleep(self.server.delay)
+        SimpleHTTPServer.SimpleHTTPRequestHandler.do_GET(self)
+        self.server.served.append((self.path, time()))
+
+    def log_message(self, *_args):
+        pass
+
+def serve_aliases(_root, _port, _delay, _peer_ids):
+    # every field of a radioid.net repeater record, the alias mapper wants them all
+    _peers = [{'id': str(int_id(_peer)), 'callsign': CALLSIGN.format(int_id(_peer)), 'city': 'Sydney', 'state': 'NSW', 'country': 'AU',
+               'frequency': '438.000', 'color_code': 1, 'offset': '-7.000', 'ts_linked': '', 'trustee': 'VK0CHK', 'ipsc_network': 'check'}
+              for _peers in _peer_ids.itervalues() for _peer in _peers]
+    with open(os.path.join(_root, 'rptrs.json'), 'w') as _file:
+        json.dump({'rptrs': _peers}, _file)
+    with open(os.path.join(_root, 'users.json'), 'w') as _file:
+        json.dump({'users': []}, _file)
+
+    SocketServer.TCPServer.allow_reuse_address = True
+    _server = SocketServer.ThreadingTCPServer(('127.0.0.1', _port), slow_handler)
+    _server.daemon_threads = True
+    _server.root, _server.delay, _server.served = _root, _delay, []
+    _thread = threading.Thread(target=_server.serve_forever, name='aliases')
+    _thread.daemon = True
+    _thread.start()
+    return _server
+
+
+#
+# DASHBOARD CLIENT
+#
+class check_client(WebSocketClientProtocol):
+    def onMessage(self, payload, isBinary):
+        if payload[:1] == 'd':
+            self.factory.check.table(payload[1:], time())
+
+
+class alias_check(object):
+    def __init__(self, _args):
+        self.args = _args
+        self.results = {'delay': _args.delay}
+        self.failures = []
+
+    def start(self):
+        _args = self.args
+        _config, _bridges, _peer_ids = mk_network(1, _args.peers, 1)
+        self.callsign = CALLSIGN.format(int_id(sorted(_peer_ids['IPSC1'])[0]))
+        self.source = traffic_source(_config, _bridges, _peer_ids)
+        reactor.listenTCP(_args.dmrlink_port, self.source)
+
+        self.tmp = tempfile.mkdtemp(prefix='dmrmonitor-alias-')
+        _www = os.path.join(self.tmp, 'www')
+        os.mkdir(_www)
+        self.aliases = serve_aliases(_www, _args.http_port, _args.delay, _peer_ids)
+
+        _cfg = os.path.join(self.tmp, 'dmrmonitor.cfg')
+        _path = os.path.dirname(os.path.abspath(_args.monitor))
+        with open(_cfg, 'w') as _file:
+            _file.write(MONITOR_CONFIG.format(dmrlink_port=_args.dmrlink_port, web_port=_args.web_port, ws_port=_args.ws_port,
+                                              http_port=_args.http_port, path=_path, tmp=self.tmp))
+        self.started = time()
+        self.monitor = subprocess.Popen([sys.executable, '-W', 'ignore', _args.monitor, '-c', _cfg], cwd=_path)
+
+        self.factory = WebSocketClientFactory('ws://127.0.0.1:{}'.format(_args.ws_port))
+        self.factory.protocol = check_client
+        self.factory.check = self
+        reactor.callLater(2, self.early)
+        reactor.callLater(_args.delay * 2 + _args.timeout, self.finish)
+
+    # Still inside the first download: the page and the raw table should be up
+    def early(self):
+        reactor.connectTCP('127.0.0.1', self.args.ws_port, self.factory)
+        _auth = 'Basic ' + base64.b64encode('dmrmon:dmrmon')
+        d = Agent(reactor).request('GET', 'http://127.0.0.1:{}/'.format(self.args.web_port), Headers({'Authorization': [_auth]}))
+        d.addCallback(self.page)
+        d.addErrback(lambda _failure: self.fail('web page did not load: {}'.format(_failure.getErrorMessage())))
+
+    def page(self, _response):
+        self.results['page'] = {'code': _response.code, 'at': round(time() - self.started, 3)}
+        if _response.code != 200:
+            self.fail('web page answered {}'.format(_response.code))
+        return readBody(_response)
+
+    def table(self, _html, _now):
+        _key = 'aliased' if self.callsign in _html else 'raw'
+        self.results.setdefault(_key, round(_now - self.started, 3))
+        if _key == 'aliased':
+            self.finish()
+
+    # When the last of the two alias files finished downloading
+    def loaded(self):
+        return max(_at for _path, _at in self.aliases.served) if len(self.aliases.served) >= 2 else None
+
+    def finish(self):
+        if 'done' in self.results:
+            return
+        self.results['done'] = True
+        _downloaded = self.loaded()
+        self.results['downloaded'] = round(_downloaded - self.started, 3) if _downloaded else None
+        _page, _raw, _aliased = self.results.get('page'), self.results.get('raw'), self.results.get('aliased')
+        if _page is None or _page['at'] >= self.args.delay:
+            self.fail('web page was not served before the aliases were downloaded')
+        if _raw is None or _raw >= self.args.delay:
+            self.fail('DMRlink table with raw IDs was not sent before the aliases were downloaded')
+        if _aliased is None:
+            self.fail('DMRlink table was never sent again with the aliases')
+        elif _downloaded is None or _aliased < self.results['downloaded']:
+            self.fail('aliased table arrived before the downloads finished')
+        self.results['failures'] = self.failures
+        print(json.dumps(self.results, indent=2, sort_keys=True))
+        self.stop()
+
+    def fail(self, _reason):
+        if _reason not in self.failures:
+            self.failures.append(_reason)
+
+    def stop(self):
+        if self.monitor.poll() is None:
+            self.monitor.terminate()
+            self.monitor.wait()
+        self.aliases.shutdown()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+        if reactor.running:
+            reactor.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check dmrmonitor.py starts without waiting on slow alias downloads')
+    parser.add_argument('--delay', type=float, default=5, help='seconds the alias server sleeps before each answer')
+    parser.add_argument('--timeout', type=float, default=10, help='seconds past both downloads to wait for the aliased table')
+    parser.add_argument('--peers', type=int, default=5, help='peers in the generated CONFIG_SND')
+    parser.add_argument('--monitor', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dmrmonitor.py'))
+    parser.add_argument('--dmrlink-port', type=int, default=14321)
+    parser.add_argument('--web-port', type=int, default=18080)
+    parser.add_argument('--ws-port', type=int, default=19000)
+    parser.add_argument('--http-port', type=int, default=18765)
+    cli_args = parser.parse_args()
+
+    check = alias_check(cli_args)
+    reactor.callWhenRunning(check.start)
+    reactor.addSystemEventTrigger('before', 'shutdown', lambda: check.monitor.poll() is None and check.monitor.terminate())
+    reactor.run()
+    sys.exit(1 if check.failures or 'done' not in check.results else 0)
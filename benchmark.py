@@ -0,0 +1,519 @@
+#!/usr/bin/env python
+#
+###############################################################################
+#   Copyright (C) 2020 VK2PSF
+#   Copyright (C) 2016-2018 Cortney T. Buffington, N0MJS <n0mjs@me.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+###############################################################################
+
+'''
+End to end benchmark for dmrmonitor.py, no DMRlink or repeaters needed.
+
+This plays DMRlink: it listens for dmrmonitor.py on the reporting port, sends
+it a generated CONFIG_SND/BRIDGE_SND for a network of the size asked for, and
+then streams RCM_SND status and BRDG_EVENT GROUP VOICE traffic at a fixed
+rate. dmrmonitor.py is started with a throw-away config pointing at us, and a
+number of headless websocket clients watch what comes out of it.
+
+Every event carries a sequence number in its subscriber ID, which shows up in
+the event log line (BRDG_EVENT) or the SRC_SUB of a table delta (RCM), so the
+clients can tell how long each one took from being sent to dmrmonitor.py to
+reaching them. RCM updates to the same timeslot are coalesced by the render
+scheduler, so for RCM only the latency of what arrives means anything; every
+bridge event should arrive.
+
+The rates are run in phases, multiplied by each --ramp step in turn, while
+the monitor's CPU and RSS are sampled from /proc. The throughput ceiling is
+the highest event rate at which all events arrived within --latency-bound.
+Results are written as JSON so runs can be compared between versions:
+
+    python benchmark.py --ipscs 4 --peers 100 --bridges 20 --ramp 1,2,4,8 -o run.json
+
+--memory skips all of that and compares the memory taken by the CTABLE and
+BTABLE entries of the plain dictionaries dmrmonitor.py used to keep against
+the state.py objects, for networks of each size given:
+
+    python benchmark.py --memory 100,1000,10000
+'''
+
+from __future__ import print_function
+
+import gc
+import os
+import re
+import sys
+import json
+import random
+import shutil
+import argparse
+import tempfile
+import subprocess
+from time import time
+from cPickle import dumps
+
+from twisted.internet import reactor, task
+from twisted.internet.protocol import ServerFactory
+from twisted.protocols.basic import NetstringReceiver
+from autobahn.twisted.websocket import WebSocketClientProtocol, WebSocketClientFactory
+
+from dmr_utils.utils import hex_str_3, hex_str_4, int_id
+
+from state import PeerState, BridgeMemberState
+
+# Does anybody read this stuff? There's a PEP somewhere that says I should do this.
+__author__     = 'Alex Stewart, VK2PSF'
+__copyright__  = 'Copyright (c) 2016-2019,2020 VK2PSF ,Cortney T. Buffington, N0MJS and the K0USY Group'
+__credits__    = 'Colin Durbridge, G4EML, Steve Zingman, N4IRS; Mike Zingman, N4IRR; Jonathan Naylor, G4KLX; Hans Barthen, DL5DI; Torsten Shultze, DG1HT'
+__license__    = 'GNU GPLv3'
+__maintainer__ = 'Alex Stewart , N0MJS'
+__email__      = 'vk2psf@arrl.net'
+
+
+MONITOR_CONFIG = '''[GLOBAL]
+REPORT_NAME: benchmark
+CONFIG_INC: True
+BRIDGES_INC: True
+DMRLINK_IP: 127.0.0.1
+DMRLINK_PORT: {dmrlink_port}
+FREQUENCY: 10
+STALL_THRESHOLD: 0
+
+[WEBSITE]
+PATH: {path}/
+WEB_SERVER_PORT: {web_port}
+WEBSERVICE_PORT: {ws_port}
+CLIENT_TIMEOUT: 0
+WEB_AUTH: False
+WEB_USER: dmrmon
+WEB_PASS: dmrmon
+
+[LOGGER]
+LOG_FILE: {tmp}/dmrmonitor.log
+LOG_HANDLERS: file
+LOG_LEVEL: INFO
+LOG_NAME: dmrmonitor
+LOG_LASTHEARD:
+
+[ALIASES]
+TRY_DOWNLOAD: False
+PATH: {tmp}/
+PEER_FILE: peer_ids.json
+SUBSCRIBER_FILE: subscriber_ids.json
+TGID_FILE: talkgroup_ids.json
+LOCAL_SUB_FILE: local_subscriber_ids.json
+LOCAL_PEER_FILE: local_peer_ids.json
+PEER_URL: http://127.0.0.1/
+SUBSCRIBER_URL: http://127.0.0.1/
+STALE_DAYS: 7
+INDEX: False
+RELOAD_HOURS: 0
+
+[HISTORY]
+ENABLED: {history}
+FILE: {tmp}/history.db
+'''
+
+# Sequence numbers travel in 3 byte subscriber IDs
+SEQ_WRAP = 0xFFFFFF
+SUB_RE = re.compile(r'SUB: (\d+)')
+TGIDS = (9, 91, 3100, 3120, 31201)
+
+
+#
+# GENERATED NETWORK
+#
+def mk_peer(_ip):
+    return {'IP': _ip, 'STATUS': {'CONNECTED': True, 'KEEP_ALIVES_SENT': 1, 'KEEP_ALIVES_RECEIVED': 1, 'KEEP_ALIVES_MISSED': 0}}
+
+def mk_network(_ipscs, _peers, _bridges):
+    _config = {}
+    _peer_ids = {}
+    for i in range(_ipscs):
+        _ipsc = 'IPSC{}'.format(i + 1)
+        _base = (i + 1) * 100000
+        _config[_ipsc] = {
+            'LOCAL': {'MASTER_PEER': True, 'RADIO_ID': hex_str_4(_base), 'IP': '10.{}.0.1'.format(i)},
+            'MASTER': dict(mk_peer('10.{}.0.2'.format(i)), RADIO_ID=hex_str_4(_base)),
+            'PEERS': dict((hex_str_4(_base + p + 1), mk_peer('10.{}.{}.{}'.format(i, p // 250, p % 250 + 3))) for p in range(_peers))
+        }
+        _peer_ids[_ipsc] = sorted(_config[_ipsc]['PEERS'])
+    _bridge_table = {}
+    for b in range(_bridges):
+        _bridge_table['BRIDGE{}'.format(b + 1)] = [
+            {'SYSTEM': _ipsc, 'TS': b % 2 + 1, 'TGID': hex_str_3(TGIDS[b % len(TGIDS)]), 'TO_TYPE': 'ON', 'TIMER': time() + 600,
+             'ACTIVE': True, 'ON': [hex_str_3(TGIDS[b % len(TGIDS)])], 'OFF': []}
+            for _ipsc in sorted(_config)]
+    return _config, _bridge_table, _peer_ids
+
+
+#
+# FAKE DMRLINK
+#
+class fake_dmrlink(NetstringReceiver):
+    MAX_LENGTH = 1 << 30
+
+    def connectionMade(self):
+        self.factory.link = self
+        self.sendString('\x01' + dumps(self.factory.config, 2))
+        self.sendString('\x03' + dumps(self.factory.bridges, 2))
+
+    def connectionLost(self, reason):
+        if self.factory.link is self:
+            self.factory.link = None
+
+    def stringReceived(self, data):
+        pass
+
+class traffic_source(ServerFactory):
+    protocol = fake_dmrlink
+
+    def __init__(self, _config, _bridges, _peer_ids):
+        self.config = _config
+        self.bridges = _bridges
+        self.peer_ids = _peer_ids
+        self.link = None
+        self.seq = 0
+        self.sent = {}
+        self.counts = {'RCM': 0, 'EVENT': 0, 'BYTES': 0}
+        self.calls = {}
+
+    def next_seq(self):
+        self.seq = self.seq % SEQ_WRAP + 1
+        self.sent[self.seq] = time()
+        return self.seq
+
+    def send(self, _data):
+        self.link.sendString(_data)
+        self.counts['BYTES'] += len(_data)
+
+    def send_rcm(self):
+        _ipsc = random.choice(sorted(self.peer_ids))
+        _peer = random.choice(self.peer_ids[_ipsc])
+        _seq = self.next_seq()
+        self.send('\x08' + _ipsc + ',\x61' + _peer + _peer + '\x00' * 4 + chr(random.randint(0, 1)) + '\x00\x01' +
+                  hex_str_3(_seq) + hex_str_3(random.choice(TGIDS)) + '\x4f\x00\x00')
+        self.counts['RCM'] += 1
+
+    # Calls alternate START and END per (ipsc, peer, ts)
+    def send_event(self):
+        _ipsc = random.choice(sorted(self.peer_ids))
+        _peer = int(random.choice(self.peer_ids[_ipsc]).encode('hex'), 16)
+        _ts = random.randint(1, 2)
+        _seq = self.next_seq()
+        _key = (_ipsc, _peer, _ts)
+        if _key in self.calls:
+            _tgid, _start = self.calls.pop(_key)
+            self.send('\x07GROUP VOICE,END,{},{},{},{},{},{},{:.1f}'.format(_ipsc, _seq, _peer, _seq, _ts, _tgid, time() - _start))
+        else:
+            _tgid = random.choice(TGIDS)
+            self.calls[_key] = (_tgid, time())
+            self.send('\x07GROUP VOICE,START,{},{},{},{},{},{}'.format(_ipsc, _seq, _peer, _seq, _ts, _tgid))
+        self.counts['EVENT'] += 1
+
+    # _rate events a second, sent in bursts every 10ms so high rates work
+    def stream(self, _send, _rate):
+        self.owed = 0.0
+        def burst():
+            if self.link is None:
+                return
+            self.owed += _rate * 0.01
+            while self.owed >= 1:
+                _send()
+                self.owed -= 1
+        _loop = task.LoopingCall(burst)
+        _loop.start(0.01)
+        return _loop
+
+
+#
+# HEADLESS DASHBOARD CLIENTS
+#
+class bench_client(WebSocketClientProtocol):
+    def onOpen(self):
+        self.factory.clients.append(self)
+        self.latency = {'RCM': [], 'EVENT': []}
+        self.seen = set()
+        self.frames = 0
+        self.bytes = 0
+
+    def onMessage(self, payload, isBinary):
+        _now = time()
+        self.frames += 1
+        self.bytes += len(payload)
+        _opcode = payload[:1]
+        if _opcode == 'l':
+            for _line in json.loads(payload[1:])['l']:
+                _match = SUB_RE.search(_line)
+                if _match:
+                    self.arrived('EVENT', int(_match.group(1)), _now)
+        elif _opcode == 'u':
+            _delta = json.loads(payload[1:])
+            if _delta['t'] == 'd':
+                for _cell in _delta['c']:
+                    if isinstance(_cell.get('SRC_SUB'), int):
+                        self.arrived('RCM', _cell['SRC_SUB'], _now)
+
+    def arrived(self, _kind, _seq, _now):
+        _sent = self.factory.source.sent.get(_seq)
+        if _sent is not None and _seq not in self.seen:
+            self.seen.add(_seq)
+            self.latency[_kind].append(_now - _sent)
+
+    def reset(self):
+        self.latency = {'RCM': [], 'EVENT': []}
+        self.seen = set()
+        self.frames = 0
+        self.bytes = 0
+
+
+#
+# MEASUREMENTS
+#
+def percentiles(_values):
+    if not _values:
+        return None
+    _values = sorted(_values)
+    _pick = lambda _p: _values[min(len(_values) - 1, int(len(_values) * _p))]
+    return {'p50': _pick(0.5), 'p90': _pick(0.9), 'p99': _pick(0.99), 'max': _values[-1], 'count': len(_values)}
+
+# (cpu seconds, rss bytes) of a process, Linux only
+def proc_usage(_pid):
+    try:
+        with open('/proc/{}/stat'.format(_pid)) as _stat:
+            _fields = _stat.read().rsplit(')', 1)[1].split()
+        with open('/proc/{}/status'.format(_pid)) as _status:
+            _rss = [int(_line.split()[1]) * 1024 for _line in _status if _line.startswith('VmRSS:')][0]
+    except (IOError, IndexError):
+        return None, None
+    return (int(_fields[11]) + int(_fields[12])) / float(os.sysconf('SC_CLK_TCK')), _rss
+
+
+class benchmark(object):
+    def __init__(self, _args):
+        self.args = _args
+        self.results = {'params': vars(_args), 'phases': []}
+
+    def start(self):
+        _args = self.args
+        _config, _bridges, _peer_ids = mk_network(_args.ipscs, _args.peers, _args.bridges)
+        self.results['network'] = {'CONFIG_SND_BYTES': len(dumps(_config, 2)), 'BRIDGE_SND_BYTES': len(dumps(_bridges, 2))}
+        self.source = traffic_source(_config, _bridges, _peer_ids)
+        reactor.listenTCP(_args.dmrlink_port, self.source)
+
+        self.tmp = tempfile.mkdtemp(prefix='dmrmonitor-bench-')
+        _cfg = os.path.join(self.tmp, 'dmrmonitor.cfg')
+        with open(_cfg, 'w') as _file:
+            _file.write(MONITOR_CONFIG.format(dmrlink_port=_args.dmrlink_port, web_port=_args.web_port, ws_port=_args.ws_port,
+                                              path=os.path.dirname(os.path.abspath(_args.monitor)), tmp=self.tmp, history=_args.history))
+        self.monitor = subprocess.Popen([sys.executable, '-W', 'ignore', _args.monitor, '-c', _cfg],
+                                        cwd=os.path.dirname(os.path.abspath(_args.monitor)))
+        self.results['monitor_version'] = git_version(os.path.dirname(os.path.abspath(_args.monitor)))
+
+        self.factory = WebSocketClientFactory('ws://127.0.0.1:{}'.format(_args.ws_port))
+        self.factory.protocol = bench_client
+        self.factory.clients = []
+        self.factory.source = self.source
+        reactor.callLater(2, self.connect_clients)
+
+    def connect_clients(self):
+        for _ in range(self.args.clients):
+            reactor.connectTCP('127.0.0.1', self.args.ws_port, self.factory)
+        reactor.callLater(self.args.warmup, self.run_phase, list(self.args.ramp))
+
+    def run_phase(self, _ramp):
+        if not _ramp:
+            return self.finish()
+        if self.source.link is None or len(self.factory.clients) < self.args.clients:
+            print('monitor not connected yet ({} of {} clients)'.format(len(self.factory.clients), self.args.clients))
+            return reactor.callLater(1, self.run_phase, _ramp)
+        _step = _ramp.pop(0)
+        _phase = {'multiplier': _step, 'rcm_rate': self.args.rcm_rate * _step, 'event_rate': self.args.event_rate * _step}
+        for _client in self.factory.clients:
+            _client.reset()
+        self.source.counts = dict.fromkeys(self.source.counts, 0)
+        _cpu, _ = proc_usage(self.monitor.pid)
+        _phase['start'] = (time(), _cpu)
+        _phase['rss'] = []
+        _sampler = task.LoopingCall(lambda: _phase['rss'].append(proc_usage(self.monitor.pid)[1]))
+        _sampler.start(1.0)
+        _loops = [self.source.stream(self.source.send_rcm, _phase['rcm_rate']), self.source.stream(self.source.send_event, _phase['event_rate'])]
+        print('phase x{}: {} RCM/s, {} events/s for {}s'.format(_step, _phase['rcm_rate'], _phase['event_rate'], self.args.duration))
+
+        def stop_sending():
+            for _loop in _loops:
+                _loop.stop()
+            # let the stragglers arrive before counting
+            reactor.callLater(self.args.drain, end_phase)
+
+        def end_phase():
+            _sampler.stop()
+            _start, _cpu_start = _phase.pop('start')
+            _cpu, _ = proc_usage(self.monitor.pid)
+            _elapsed = time() - _start
+            _events = [_l for _c in self.factory.clients for _l in _c.latency['EVENT']]
+            _rcm = [_l for _c in self.factory.clients for _l in _c.latency['RCM']]
+            _rss = [_r for _r in _phase.pop('rss') if _r]
+            _expected = self.source.counts['EVENT'] * len(self.factory.clients)
+            _phase.update({
+                'sent': dict(self.source.counts),
+                'event_latency': percentiles(_events),
+                'rcm_latency': percentiles(_rcm),
+                'events_delivered': float(len(_events)) / _expected if _expected else None,
+                'client_frames': sum(_c.frames for _c in self.factory.clients),
+                'client_bytes': sum(_c.bytes for _c in self.factory.clients),
+                'cpu_percent': 100 * (_cpu - _cpu_start) / _elapsed if _cpu is not None and _cpu_start is not None else None,
+                'rss_max': max(_rss) if _rss else None
+            })
+            self.results['phases'].append(_phase)
+            print(json.dumps(_phase, sort_keys=True))
+            self.run_phase(_ramp)
+
+        reactor.callLater(self.args.duration, stop_sending)
+
+    def finish(self):
+        _ok = [_p['event_rate'] for _p in self.results['phases']
+               if _p['events_delivered'] is not None and _p['events_delivered'] >= 0.999
+               and _p['event_latency'] and _p['event_latency']['p99'] <= self.args.latency_bound]
+        self.results['throughput_ceiling'] = max(_ok) if _ok else None
+        if self.args.output:
+            with open(self.args.output, 'w') as _file:
+                json.dump(self.results, _file, indent=2, sort_keys=True)
+        print(json.dumps({'throughput_ceiling': self.results['throughput_ceiling']}))
+        self.stop()
+
+    def stop(self):
+        if self.monitor.poll() is None:
+            self.monitor.terminate()
+            self.monitor.wait()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+        if reactor.running:
+            reactor.stop()
+
+#
+# TABLE MEMORY
+#
+# Every object reachable from _obj, each counted once, and how many of them
+# the garbage collector has to track
+def deep_size(_obj):
+    _seen = set()
+    _stack = [_obj]
+    _bytes = _tracked = 0
+    while _stack:
+        _obj = _stack.pop()
+        if id(_obj) in _seen:
+            continue
+        _seen.add(id(_obj))
+        _bytes += sys.getsizeof(_obj)
+        _tracked += gc.is_tracked(_obj)
+        if isinstance(_obj, dict):
+            _stack.extend(_obj.iterkeys())
+            _stack.extend(_obj.itervalues())
+        elif isinstance(_obj, (list, tuple)):
+            _stack.extend(_obj)
+        elif hasattr(_obj, '__slots__'):
+            _stack.extend(getattr(_obj, _slot) for _slot in _obj.__slots__ if hasattr(_obj, _slot))
+    return _bytes, _tracked
+
+# The CTABLE peer and BTABLE entry layout from before state.py
+def dict_peer(_type, _peer, _alias, _config_peer_data, _now):
+    _stats_peer = {'TYPE': _type, 'RADIO_ID': int_id(_peer), 'ALIAS': _alias, 'IP': _config_peer_data['IP']}
+    for _field in ('CONNECTED', 'KEEP_ALIVES_SENT', 'KEEP_ALIVES_RECEIVED', 'KEEP_ALIVES_MISSED'):
+        _stats_peer[_field] = _config_peer_data['STATUS'][_field]
+    for _ts in (1, 2):
+        _stats_peer[_ts] = {'STATUS': '', 'TYPE': '', 'SRC_PEER': '', 'SRC_SUB': '', 'DEST': '', 'COLOR': '#ffffff', 'LAST': _now}
+    return _stats_peer
+
+def dict_call(_peer, _ts, _sub, _src_peer, _dest, _now):
+    _peer[_ts].update(STATUS='Active', TYPE='Group Voice', SRC_SUB=_sub, SRC_PEER=_src_peer, DEST=_dest, COLOR='#00ff00', LAST=_now)
+
+def dict_member(_system):
+    return {'TS': _system['TS'], 'TGID': int_id(_system['TGID']), 'EXPIRES': _system['TIMER'], 'TO_ACTION': 'Disconnect',
+            'ACTIVE': 'Connected', 'COLOR': '#00ff00', 'TRIG_ON': ', '.join(str(int_id(_t)) for _t in _system['ON']), 'TRIG_OFF': ''}
+
+def slotted_call(_peer, _ts, _sub, _src_peer, _dest, _now):
+    _peer.timeslot(_ts).active('Active', 'Group Voice', _sub, _src_peer, _dest, _now)
+
+def slotted_member(_system):
+    return BridgeMemberState(dict(_system, ON=[int_id(_t) for _t in _system['ON']]))
+
+# A table for every peer with a call on each timeslot from one of 500
+# subscribers, aliases made fresh each time as alias_string() does
+def table_memory(_peers, _ipscs):
+    _config, _bridges, _ = mk_network(_ipscs, max(1, _peers // _ipscs), max(1, _peers // 10))
+    _results = {}
+    for _model, (_mk_peer, _call, _mk_member) in (('dict', (dict_peer, dict_call, dict_member)), ('slots', (PeerState, slotted_call, slotted_member))):
+        _now = time()
+        random.seed(_peers)
+        _ctable = {}
+        for _ipsc, _ipsc_data in _config.iteritems():
+            _stats_peers = _ctable.setdefault(_ipsc, {'MASTER': True, 'RADIO_ID': 1, 'IP': '', 'PEERS': {}})['PEERS']
+            for _peer, _config_peer_data in _ipsc_data['PEERS'].iteritems():
+                _stats_peers[_peer] = _stats_peer = _mk_peer('Peer', _peer, '{} VK2{:03d}'.format(int_id(_peer), int_id(_peer) % 1000), _config_peer_data, _now)
+                for _ts in (1, 2):
+                    _sub = random.randint(1, 500)
+                    _call(_stats_peer, _ts, '{} VK2SUB{}'.format(_sub, _sub), '{} VK2{:03d}'.format(int_id(_peer), int_id(_peer) % 1000), 3100, _now)
+        _btable = dict((_bridge, dict((_system['SYSTEM'], _mk_member(_system)) for _system in _systems)) for _bridge, _systems in _bridges.iteritems())
+        _ctable_bytes, _ctable_tracked = deep_size(_ctable)
+        _btable_bytes, _btable_tracked = deep_size(_btable)
+        _results[_model] = {'CTABLE_BYTES': _ctable_bytes, 'BTABLE_BYTES': _btable_bytes, 'GC_TRACKED': _ctable_tracked + _btable_tracked}
+    _results['PEERS'] = sum(len(_ipsc_data['PEERS']) for _ipsc_data in _config.itervalues())
+    _results['BRIDGE_MEMBERS'] = sum(len(_systems) for _systems in _bridges.itervalues())
+    _results['SAVED'] = 1 - float(_results['slots']['CTABLE_BYTES'] + _results['slots']['BTABLE_BYTES']) / (_results['dict']['CTABLE_BYTES'] + _results['dict']['BTABLE_BYTES'])
+    return _results
+
+
+def git_version(_path):
+    try:
+        return subprocess.check_output(['git', 'describe', '--always', '--dirty'], cwd=_path, stderr=open(os.devnull, 'w')).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='End to end benchmark for dmrmonitor.py against a fake DMRlink')
+    parser.add_argument('--ipscs', type=int, default=2, help='IPSC systems in the generated CONFIG_SND')
+    parser.add_argument('--peers', type=int, default=50, help='peers in each IPSC')
+    parser.add_argument('--bridges', type=int, default=10, help='conference bridges, each with every IPSC')
+    parser.add_argument('--rcm-rate', type=float, default=20, help='RCM_SND status packets a second before the ramp')
+    parser.add_argument('--event-rate', type=float, default=10, help='BRDG_EVENTs a second before the ramp')
+    parser.add_argument('--ramp', type=lambda _s: [float(_x) for _x in _s.split(',')], default=[1, 2, 4, 8], help='rate multipliers, one phase each')
+    parser.add_argument('--duration', type=float, default=10, help='seconds of traffic in each phase')
+    parser.add_argument('--drain', type=float, default=2, help='seconds to wait for late arrivals after each phase')
+    parser.add_argument('--warmup', type=float, default=3, help='seconds between the clients connecting and the first phase')
+    parser.add_argument('--clients', type=int, default=5, help='headless websocket clients')
+    parser.add_argument('--latency-bound', type=float, default=1.0, help='p99 event latency a phase must stay within to count for the ceiling')
+    parser.add_argument('--history', action='store_true', help='run with the call history database enabled')
+    parser.add_argument('--monitor', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dmrmonitor.py'))
+    parser.add_argument('--dmrlink-port', type=int, default=14321)
+    parser.add_argument('--web-port', type=int, default=18080)
+    parser.add_argument('--ws-port', type=int, default=19000)
+    parser.add_argument('-o', '--output', help='write the results here as JSON')
+    parser.add_argument('--memory', type=lambda _s: [int(_x) for _x in _s.split(',')], help='only compare table memory, at these numbers of peers')
+    cli_args = parser.parse_args()
+
+    if cli_args.memory:
+        _results = {'monitor_version': git_version(os.path.dirname(os.path.abspath(__file__))),
+                    'memory': [table_memory(_peers, cli_args.ipscs) for _peers in cli_args.memory]}
+        print(json.dumps(_results, indent=2, sort_keys=True))
+        if cli_args.output:
+            with open(cli_args.output, 'w') as _file:
+                json.dump(_results, _file, indent=2, sort_keys=True)
+        sys.exit(0)
+
+    bench = benchmark(cli_args)
+    reactor.callWhenRunning(bench.start)
+    reactor.addSystemEventTrigger('before', 'shutdown', lambda: bench.monitor.poll() is None and bench.monitor.terminate())
+    reactor.run()
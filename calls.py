@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+#
+###############################################################################
+#   Copyright (C) 2020 VK2PSF
+#   Copyright (C) 2016-2018 Cortney T. Buffington, N0MJS <n0mjs@me.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+###############################################################################
+
+'''
+In-flight call tracking for dmrmonitor.py. DMRlink reports the START and END
+of every bridged GROUP VOICE call as separate events; this pairs them up by
+(ipsc, peer, timeslot, tgid) and hands back one completed call record with the
+duration we measured, next to the one DMRlink reported.
+
+A START whose END never arrives is expired by a timer wheel: calls are filed
+in the slot for the tick they time out on, so each tick only looks at the
+calls that are actually due instead of scanning every call in progress.
+'''
+
+from time import time
+
+# Does anybody read this stuff? There's a PEP somewhere that says I should do this.
+__author__     = 'Alex Stewart, VK2PSF'
+__copyright__  = 'Copyright (c) 2016-2019,2020 VK2PSF ,Cortney T. Buffington, N0MJS and the K0USY Group'
+__credits__    = 'Colin Durbridge, G4EML, Steve Zingman, N4IRS; Mike Zingman, N4IRR; Jonathan Naylor, G4KLX; Hans Barthen, DL5DI; Torsten Shultze, DG1HT'
+__license__    = 'GNU GPLv3'
+__maintainer__ = 'Alex Stewart , N0MJS'
+__email__      = 'vk2psf@arrl.net'
+
+
+# How a completed call record came to be closed
+COMPLETE   = 'COMPLETE'     # START and END paired up
+ORPHAN     = 'ORPHAN'       # no END within the timeout
+SUPERSEDED = 'SUPERSEDED'   # a new START arrived for the same key first
+UNMATCHED  = 'UNMATCHED'    # END with no START we know of
+
+
+class call_tracker(object):
+    # _timeout is how long a call may run without an END, checked every
+    # _resolution seconds by tick(). _complete is called with each record.
+    def __init__(self, _timeout, _complete, _resolution=1.0):
+        self.resolution = _resolution
+        self.complete = _complete
+        self.active = {}
+        self.wheel = [set() for _ in range(int(_timeout / _resolution) + 1)]
+        self.cursor = 0
+        self.tgids = {}
+        self.peers = {}
+        self.stats = {COMPLETE: 0, ORPHAN: 0, SUPERSEDED: 0, UNMATCHED: 0}
+
+    def __len__(self):
+        return len(self.active)
+
+    # _key is (ipsc, peer, ts, tgid)
+    def start(self, _key, _sub, _now=None):
+        if _key in self.active:
+            self.close(_key, SUPERSEDED, _now)
+        # the slot after the last one to tick is a full timeout away
+        _slot = (self.cursor - 1) % len(self.wheel)
+        self.active[_key] = {'SUB': _sub, 'START': _now or time(), 'SLOT': _slot}
+        self.wheel[_slot].add(_key)
+        self.count(_key, 1)
+
+    def end(self, _key, _sub, _reported=None, _now=None):
+        if _key in self.active:
+            return self.close(_key, COMPLETE, _now, _reported)
+        _now = _now or time()
+        self.stats[UNMATCHED] += 1
+        _record = self.record(_key, _sub, _now, _now, UNMATCHED, _reported)
+        self.complete(_record)
+        return _record
+
+    def close(self, _key, _status, _now=None, _reported=None):
+        _call = self.active.pop(_key)
+        self.wheel[_call['SLOT']].discard(_key)
+        self.count(_key, -1)
+        self.stats[_status] += 1
+        _record = self.record(_key, _call['SUB'], _call['START'], _now or time(), _status, _reported)
+        self.complete(_record)
+        return _record
+
+    # Without an END we only know when we gave up on the call, not how long
+    # it ran, so ORPHAN and SUPERSEDED records carry no DURATION
+    def record(self, _key, _sub, _start, _end, _status, _reported):
+        _ipsc, _peer, _ts, _tgid = _key
+        return {
+            'IPSC': _ipsc, 'PEER': _peer, 'TS': _ts, 'TGID': _tgid, 'SUB': _sub,
+            'START': _start, 'END': _end, 'DURATION': None if _status in (ORPHAN, SUPERSEDED) else _end - _start,
+            'REPORTED': _reported, 'STATUS': _status
+        }
+
+    # Called every resolution seconds, expires the calls in the slot that's due
+    def tick(self):
+        self.cursor = (self.cursor + 1) % len(self.wheel)
+        _due = self.wheel[self.cursor]
+        if not _due:
+            return 0
+        _expired = len(_due)
+        _now = time()
+        for _key in list(_due):
+            self.close(_key, ORPHAN, _now)
+        return _expired
+
+    def count(self, _key, _delta):
+        for _counts, _id in ((self.tgids, _key[3]), (self.peers, _key[1])):
+            _n = _counts.get(_id, 0) + _delta
+            if _n:
+                _counts[_id] = _n
+            else:
+                del _counts[_id]
+
+    # What the dashboard shows: total, and calls in progress per TGID and peer
+    def summary(self):
+        return {'n': len(self.active), 'tg': self.tgids, 'p': self.peers}
@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+#
+###############################################################################
+#   Copyright (C) 2020 VK2PSF
+#   Copyright (C) 2016-2018 Cortney T. Buffington, N0MJS <n0mjs@me.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+###############################################################################
+
+'''
+Recording and replay of the raw DMRlink reporting stream.
+
+A capture is a short header followed by one record per netstring: the time
+since the capture started and the length, packed as '>dI', then the message
+exactly as DMRlink sent it. Captures whose name ends in .gz are compressed.
+The times only ever go forwards, even if the wall clock is stepped back
+while recording.
+
+capture_replay feeds a capture back through dmrmonitor.py at the speed it
+was recorded, N times faster, or as fast as it will go.
+'''
+
+import gzip
+import zlib
+import struct
+import logging
+from time import time
+
+from twisted.internet import reactor, task
+
+# Does anybody read this stuff? There's a PEP somewhere that says I should do this.
+__author__     = 'Alex Stewart, VK2PSF'
+__copyright__  = 'Copyright (c) 2016-2019,2020 VK2PSF ,Cortney T. Buffington, N0MJS and the K0USY Group'
+__credits__    = 'Colin Durbridge, G4EML, Steve Zingman, N4IRS; Mike Zingman, N4IRR; Jonathan Naylor, G4KLX; Hans Barthen, DL5DI; Torsten Shultze, DG1HT'
+__license__    = 'GNU GPLv3'
+__maintainer__ = 'Alex Stewart , N0MJS'
+__email__      = 'vk2psf@arrl.net'
+
+logger = logging.getLogger(__name__)
+
+
+MAGIC  = 'DMRCAP1\n'
+# wall clock time the capture started
+HEADER = struct.Struct('>d')
+# seconds since the start, message length
+RECORD = struct.Struct('>dI')
+# Messages replayed before giving the reactor a turn at full speed
+BATCH  = 500
+
+
+def open_capture(_file, _mode):
+    if _file.endswith('.gz'):
+        return gzip.open(_file, _mode)
+    return open(_file, _mode)
+
+
+class capture_writer(object):
+    def __init__(self, _file, _flush=1.0):
+        self.file = _file
+        self.stats = {'MESSAGES': 0, 'BYTES': 0}
+        self.start = time()
+        self.last = 0.0
+        self.out = open_capture(_file, 'ab')
+        self.out.write(MAGIC + HEADER.pack(self.start))
+        # Flushed every so often rather than per message, and on the way out
+        self.flusher = task.LoopingCall(self.out.flush)
+        self.flusher.start(_flush, now=False)
+        reactor.addSystemEventTrigger('before', 'shutdown', self.close)
+        logger.info('(CAPTURE) recording the DMRlink stream to %s', _file)
+
+    def write(self, _data):
+        self.last = max(self.last, time() - self.start)
+        self.out.write(RECORD.pack(self.last, len(_data)) + _data)
+        self.stats['MESSAGES'] += 1
+        self.stats['BYTES'] += len(_data)
+
+    def close(self):
+        if self.flusher.running:
+            self.flusher.stop()
+        self.out.close()
+        logger.info('(CAPTURE) %s closed after %s messages, %s bytes', self.file, self.stats['MESSAGES'], self.stats['BYTES'])
+
+
+# (seconds since the start, message) for each record. A capture appended to
+# more than once is read as one, each part starting where the last left off.
+# A capture cut short by a crash, compressed or not, ends at the last whole
+# record before the damage; anything appended after it is lost.
+def read_capture(_file):
+    with open_capture(_file, 'rb') as _in:
+        _base = _offset = 0.0
+        while True:
+            try:
+                _head = _in.read(RECORD.size)
+                # no record starts with MAGIC, it would be ~1e21 seconds in
+                if _head[:len(MAGIC)] == MAGIC:
+                    _in.read(len(MAGIC) + HEADER.size - RECORD.size)
+                    _base = _offset
+                    continue
+                if len(_head) < RECORD.size:
+                    return
+                _seconds, _length = RECORD.unpack(_head)
+                _data = _in.read(_length)
+            except (IOError, EOFError, zlib.error) as _error:
+                logger.warning('(CAPTURE) %s is damaged, stopping after %.3fs: %s', _file, _offset, _error)
+                return
+            if len(_data) < _length:
+                logger.warning('(CAPTURE) %s ends part way through a message', _file)
+                return
+            _offset = _base + _seconds
+            yield _offset, _data
+
+
+class capture_replay(object):
+    # _speed 0 is as fast as possible. _busy() says to wait a moment, so the
+    # config decoded in the background lands before the traffic that uses it.
+    def __init__(self, _file, _speed, _deliver, _done=None, _busy=None):
+        self.file = _file
+        self.speed = _speed
+        self.deliver = _deliver
+        self.done = _done
+        self.busy = _busy or (lambda: False)
+        self.records = read_capture(_file)
+        self.pending = None
+        self.stats = {'MESSAGES': 0, 'BYTES': 0, 'SECONDS': 0.0}
+
+    def start(self):
+        self.started = time()
+        logger.info('(CAPTURE) replaying %s at %s', self.file, '{}x'.format(self.speed) if self.speed else 'full speed')
+        self.step()
+
+    def step(self):
+        _sent = 0
+        while _sent < BATCH:
+            if self.busy():
+                reactor.callLater(0.01, self.step)
+                return
+            if self.pending is None:
+                self.pending = next(self.records, None)
+                if self.pending is None:
+                    return self.finish()
+            _offset, _data = self.pending
+            if self.speed:
+                _wait = self.started + _offset / self.speed - time()
+                if _wait > 0:
+                    reactor.callLater(_wait, self.step)
+                    return
+            self.pending = None
+            self.deliver(_data)
+            self.stats['MESSAGES'] += 1
+            self.stats['BYTES'] += len(_data)
+            _sent += 1
+        reactor.callLater(0, self.step)
+
+    def finish(self):
+        self.stats['SECONDS'] = time() - self.started
+        _rate = self.stats['MESSAGES'] / self.stats['SECONDS'] if self.stats['SECONDS'] else 0
+        logger.info('(CAPTURE) replay of %s done: %s messages, %s bytes in %.3fs, %.0f messages/s',
+                    self.file, self.stats['MESSAGES'], self.stats['BYTES'], self.stats['SECONDS'], _rate)
+        if self.done is not None:
+            self.done(self.stats)
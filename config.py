@@ -53,6 +53,8 @@ def build_config(_config_file):
     CONFIG['WEBSITE'] = {}
     CONFIG['LOGGER'] = {}
     CONFIG['ALIASES'] = {}
+    # Optional, history is off unless the section turns it on
+    CONFIG['HISTORY'] = {'ENABLED': False}
 
     try:
         for section in config.sections():
@@ -63,7 +65,16 @@ def build_config(_config_file):
                     'BRIDGES_INC': config.get(section, 'BRIDGES_INC'),
                     'DMRLINK_IP': config.get(section, 'DMRLINK_IP'),
                     'DMRLINK_PORT': config.getint(section, 'DMRLINK_PORT'),
-                    'FREQUENCY': config.getint(section, 'FREQUENCY')
+                    'FREQUENCY': config.getint(section, 'FREQUENCY'),
+                    'RENDER_WINDOW': config.getfloat(section, 'RENDER_WINDOW', fallback=0.5),
+                    'RENDER_RATE': config.getfloat(section, 'RENDER_RATE', fallback=2.0),
+                    'CHECKPOINT': config.getint(section, 'CHECKPOINT', fallback=0),
+                    'CALL_TIMEOUT': config.getint(section, 'CALL_TIMEOUT', fallback=300),
+                    'TRAFFIC_SERIES': config.getint(section, 'TRAFFIC_SERIES', fallback=1000),
+                    'TOP_CAPACITY': config.getint(section, 'TOP_CAPACITY', fallback=200),
+                    'STALL_THRESHOLD': config.getfloat(section, 'STALL_THRESHOLD', fallback=0.5),
+                    'CAPTURE_FILE': config.get(section, 'CAPTURE_FILE', fallback=''),
+                    'MAX_PAYLOAD': config.getint(section, 'MAX_PAYLOAD', fallback=1048576)
                 })
 
             elif section == 'WEBSITE':
@@ -74,7 +85,11 @@ def build_config(_config_file):
                     'CLIENT_TIMEOUT': config.getint(section, 'CLIENT_TIMEOUT'),
                     'WEB_AUTH': config.get(section, 'WEB_AUTH'),
                     'WEB_USER': config.get(section, 'WEB_USER'),
-                    'WEB_PASS': config.get(section, 'WEB_PASS')
+                    'WEB_PASS': config.get(section, 'WEB_PASS'),
+                    'CLIENT_QUEUE': config.getint(section, 'CLIENT_QUEUE', fallback=100),
+                    'SLOW_CLIENT': config.getint(section, 'SLOW_CLIENT', fallback=30),
+                    'LOG_BUFFER': config.getint(section, 'LOG_BUFFER', fallback=100),
+                    'TEMPLATE_CACHE': config.get(section, 'TEMPLATE_CACHE', fallback='')
                 })
 
             elif section == 'LOGGER':
@@ -100,6 +115,17 @@ def build_config(_config_file):
                     'PEER_URL': config.get(section, 'PEER_URL'),
                     'SUBSCRIBER_URL': config.get(section, 'SUBSCRIBER_URL'),
                     'STALE_TIME': config.getint(section, 'STALE_DAYS') * 86400,
+                    'CACHE_SIZE': config.getint(section, 'CACHE_SIZE', fallback=10000),
+                    'INDEX': config.getboolean(section, 'INDEX', fallback=False),
+                    'RELOAD_HOURS': config.getfloat(section, 'RELOAD_HOURS', fallback=24),
+                })
+
+            elif section == 'HISTORY':
+                CONFIG['HISTORY'].update({
+                    'ENABLED': config.getboolean(section, 'ENABLED'),
+                    'FILE': config.get(section, 'FILE'),
+                    'COMMIT_SECONDS': config.getfloat(section, 'COMMIT_SECONDS', fallback=1.0),
+                    'QUERY_LIMIT': config.getint(section, 'QUERY_LIMIT', fallback=1000)
                 })
 
     except configparser.Error as err:
@@ -38,33 +38,48 @@ from __future__ import print_function
 # Standard modules
 
 import sys
+import json
+import logging
 
 # Twisted modules
 from twisted.internet.protocol import ReconnectingClientFactory, Protocol
 from twisted.protocols.basic import NetstringReceiver
-from twisted.internet import reactor, task
-from twisted.web.server import Site
+from twisted.internet import reactor, task, threads
+from twisted.web.server import Site, NOT_DONE_YET
 from twisted.web.static import File
 from twisted.web.resource import Resource
+from twisted.internet.interfaces import IPushProducer
+from zope.interface import implementer
 import base64
 # Autobahn provides websocket service under Twisted
 from autobahn.twisted.websocket import WebSocketServerProtocol, WebSocketServerFactory
 
 # Specific functions to import from standard modules
 from pprint import pprint
-from time import time, strftime, localtime
-from cPickle import loads
+from time import time, strftime, strptime, localtime, mktime
+from cPickle import Unpickler, UnpicklingError
+from cStringIO import StringIO
 from binascii import b2a_hex as h
 from os.path import getmtime
 from collections import deque
 
 # Web templating environment
-from jinja2 import Environment, PackageLoader, select_autoescape
+from jinja2 import Environment, PackageLoader, FileSystemBytecodeCache, Markup, select_autoescape
 
 # Utilities from K0USY Group sister project
-from dmr_utils.utils import int_id, get_alias, try_download, mk_full_id_dict
+from dmr_utils.utils import int_id, try_download, mk_full_id_dict
 import config
 import log
+from alias import alias_resolver, load_index
+from history import call_history
+from calls import call_tracker
+from traffic import traffic_stats
+from leaderboard import leaderboard, WINDOWS, METRICS as TOP_METRICS
+from metrics import metric_registry, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from watchdog import stall_watchdog
+from capture import capture_writer, capture_replay
+from rcm import decode_rcm, rcm_error, RCM_NAMES
+from state import PeerState, BridgeMemberState, shared, RED, GREEN, BLUE, ORANGE, WHITE
 
 # IPSC constants
 from ipsc_const import *
@@ -90,12 +105,13 @@ BTABLE      = {}
 BTABLE['BRIDGES'] = {}
 BRIDGES_RX  = ''
 CONFIG_RX   = ''
-LOGBUF      = deque(100*[''], 100)
-RED         = '#ff0000'
-GREEN       = '#00ff00'
-BLUE        = '#0000ff'
-ORANGE      = '#ff8000'
-WHITE       = '#ffffff'
+LOGBUF      = None
+history     = None
+tracker     = None
+traffic     = None
+leaders     = None
+active_pending = None
+capture     = None
 
 
 # Does anybody read this stuff? There's a PEP somewhere that says I should do this.
@@ -109,6 +125,57 @@ __email__      = 'vk2psf@arrl.net'
 # Global variables used whether we are a module or __main__
 systems = {}
 
+#
+# INTERNAL METRICS
+#   Served at /metrics. Things counted here cost a dictionary update, the
+#   rest are read from the stats the other parts already keep when scraped.
+#
+OPCODE_NAMES = dict((_byte, _name) for _name, _byte in OPCODE.iteritems())
+
+# Started from __main__ when GLOBAL STALL_THRESHOLD is set. Whatever is about
+# to keep the reactor busy sets stalls.stage so a stall can be pinned on it.
+stalls = stall_watchdog(0)
+
+metrics = metric_registry()
+MSG_COUNT   = metrics.counter('dmrmonitor_dmrlink_messages_total', 'Messages received from DMRlink', ('opcode',))
+MSG_BYTES   = metrics.counter('dmrmonitor_dmrlink_bytes_total', 'Bytes received from DMRlink', ('opcode',))
+RCM_COUNT   = metrics.counter('dmrmonitor_rcm_packets_total', 'RCM packets received, by type or why they were rejected', ('type',))
+RENDER_TIME = metrics.histogram('dmrmonitor_render_seconds', 'Time to render a table or build a delta', ('template',))
+DECODE_TIME = metrics.histogram('dmrmonitor_decode_seconds', 'Time to unpickle a DMRlink payload', ('opcode',))
+FANOUT      = metrics.histogram('dmrmonitor_broadcast_clients', 'Clients each broadcast went to', (), (0, 1, 2, 5, 10, 20, 50, 100, 200))
+FRAGMENTS   = metrics.counter('dmrmonitor_fragments_total', 'Table fragments served from the fragment cache or rendered', ('template', 'result'))
+REACTOR_LAG = metrics.histogram('dmrmonitor_reactor_lag_seconds', 'How late the reactor ran a timer that was due')
+
+metrics.collect('dmrmonitor_websocket_clients', 'Connected dashboard clients', 'gauge', lambda: len(dashboard_server.clients))
+metrics.collect('dmrmonitor_broadcast_bytes_total', 'Bytes sent to dashboard clients', 'counter', lambda: dashboard_server.stats['BYTES'])
+metrics.collect('dmrmonitor_broadcast_seconds_total', 'Time spent broadcasting', 'counter', lambda: dashboard_server.stats['SECONDS'])
+metrics.collect('dmrmonitor_alias_cache_hits_total', 'Alias lookups served from the cache', 'counter', lambda: alias_cache.hits)
+metrics.collect('dmrmonitor_alias_cache_misses_total', 'Alias lookups that had to be formatted', 'counter', lambda: alias_cache.misses)
+metrics.collect('dmrmonitor_alias_cache_hit_ratio', 'Alias cache hits over all lookups', 'gauge', lambda: alias_cache.stats()['HIT_RATE'])
+metrics.collect('dmrmonitor_snapshot_cache_hits_total', 'Client snapshots served from the cache', 'counter', lambda: snapshots.hits)
+metrics.collect('dmrmonitor_decode_dropped_total', 'Decoded payloads dropped as stale', 'counter', lambda: dict(((_op,), _s['DROPPED']) for _op, _s in decoder.stats.iteritems()), ('opcode',))
+metrics.collect('dmrmonitor_decode_rejected_total', 'Payloads rejected undecoded for being over MAX_PAYLOAD', 'counter', lambda: dict(((_op,), _s['REJECTED']) for _op, _s in decoder.stats.iteritems()), ('opcode',))
+metrics.collect('dmrmonitor_reactor_lag_last_seconds', 'Reactor lag at the last check', 'gauge', lambda: lag.last)
+metrics.collect('dmrmonitor_reactor_stalls_total', 'Times the reactor was blocked past the stall threshold', 'counter', lambda: stalls.count)
+metrics.collect('dmrmonitor_calls_active', 'Bridged calls in progress', 'gauge', lambda: len(tracker))
+metrics.collect('dmrmonitor_calls_closed_total', 'Calls closed by the call tracker', 'counter', lambda: dict(((_status,), _n) for _status, _n in tracker.stats.iteritems()), ('status',))
+metrics.collect('dmrmonitor_log_lines_total', 'Event log lines', 'counter', lambda: LOGBUF.seq)
+
+# A timer that should fire every _interval seconds, how late it is is how
+# long everything else kept the reactor busy
+class lag_probe(object):
+    def __init__(self, _interval):
+        self.interval = _interval
+        self.due = None
+        self.last = 0.0
+
+    def tick(self):
+        _now = time()
+        if self.due is not None:
+            self.last = max(0.0, _now - self.due)
+            REACTOR_LAG.observe(self.last)
+        self.due = _now + self.interval
+
 # Shut ourselves down gracefully by disconnecting from the masters and peers.
 def dmrmonitor_handler(_signal, _frame):
     for system in systems:
@@ -120,148 +187,91 @@ def get_template(_file):
     with open(_file, 'r') as html:
         return html.read()
 
-# Alias string processor
+# Alias string processors, formatted strings are memoized by the alias cache
 def alias_string(_id, _dict):
-    alias = get_alias(_id, _dict, 'CALLSIGN', 'CITY', 'STATE')
-    if type(alias) == list:
-        for x,item in enumerate(alias):
-            if item == None:
-                alias.pop(x)
-        return ', '.join(alias)
-    else:
-        return alias
+    return alias_cache.resolve(_id, _dict, 'string')
 
 def alias_short(_id, _dict):
-    alias = get_alias(_id, _dict, 'CALLSIGN', 'NAME')
-    if type(alias) == list:
-        for x,item in enumerate(alias):
-            if item == None:
-                alias.pop(x)
-        return ', '.join(alias)
-    else:
-        return str(alias)
+    return alias_cache.resolve(_id, _dict, 'short')
 
 def alias_call(_id, _dict):
-    alias =  get_alias(_id, _dict, 'CALLSIGN')
-    if type(alias) == list:
-        return str(alias[0])
-    else:
-        return str(alias)
+    return alias_cache.resolve(_id, _dict, 'call')
 
 def alias_tgid(_id, _dict):
-    alias = get_alias(_id, _dict, 'NAME')
-    if type(alias) == list:
-        return str(alias[0])
-    else:
-        return str(alias)
+    return alias_cache.resolve(_id, _dict, 'tgid')
 
 #
 # REPEATER CALL MONITOR (RCM) PACKET PROCESSING
 #
+# Timeslot states in CALL_MON_RPT
+RPT_STATES = {'\x01': ('Repeating', GREEN), '\x03': ('Disabled', RED), '\x04': ('Enabled', GREEN)}
+
 def process_rcm(_data):
     now = time()
-    _payload = _data.split(',', 1)
-    _name = _payload[0]
-    _data = _payload[1]
-    _packettype = _data[0]
+    try:
+        _name, _packettype, _rcm = decode_rcm(_data)
+    except rcm_error as e:
+        RCM_COUNT.inc((e.reason,))
+        logger.warning('RCM rejected, %s: %s', e, repr(_data))
+        return
+    RCM_COUNT.inc((RCM_NAMES[_packettype],))
+    # CONFIG_SND is decoded in the background, RCM can beat it to the table
+    _peer = CTABLE[_name]['PEERS'].get(_rcm.SOURCE) if _name in CTABLE else None
+    if _peer is None:
+        logger.debug('RCM for a peer not in the table yet: %s %s', _name, repr(_rcm.SOURCE))
+        return
     if _packettype == CALL_MON_STATUS:
-        logger.debug('RCM STATUS: {}: {}'.format(_name, repr(_data)))
-        _source   = _data[1:5]
-        _src_peer = int_id(_data[5:9])
-        #_seq_num  = _data[9:13]
-        _ts       = int_id(_data[13])+1
-        _status   = STATUS[_data[15]] # suspect [14:16] but nothing in leading byte?
-        _src_sub  = int_id(_data[16:19])
-        _dest     = int_id(_data[19:22])
-        _type     = TYPE[_data[22]]
-        #_prio     = _data[23]
-        #_sec      = _data[24]
+        logger.debug('RCM STATUS: {}: {}'.format(_name, repr(_rcm)))
+        _status = _rcm.STATUS
+        _slot   = _peer.timeslot(_rcm.TS)
+        _slots  = [_rcm.TS]
+
+        # Each new call, or change in its status, on the timeslot goes into the history
+        _call = (_status, _rcm.SRC_SUB, _rcm.DEST)
+        if history is not None and _status != 'BSID ON' and _slot.CALL != _call:
+            history.record('RCM', _status, _name, int_id(_rcm.SOURCE), _rcm.SRC_SUB, _rcm.TS, _rcm.DEST, _src_peer=_rcm.SRC_PEER, _type=_rcm.TYPE)
+        _slot.CALL = _call
 
         if _status != 'End' and _status != 'BSID ON':
-            CTABLE[_name]['PEERS'][_source][_ts]['STATUS'] = _status
-            CTABLE[_name]['PEERS'][_source][_ts]['TYPE'] = _type
-            CTABLE[_name]['PEERS'][_source][_ts]['SRC_SUB'] = alias_string(_src_sub, subscriber_ids)
-            CTABLE[_name]['PEERS'][_source][_ts]['SRC_PEER'] = alias_string(_src_peer, peer_ids)
-            CTABLE[_name]['PEERS'][_source][_ts]['DEST'] = _dest
-            CTABLE[_name]['PEERS'][_source][_ts]['COLOR'] = GREEN
-            CTABLE[_name]['PEERS'][_source][_ts]['LAST'] = now
+            _slot.active(_status, _rcm.TYPE, alias_string(_rcm.SRC_SUB, subscriber_ids), alias_string(_rcm.SRC_PEER, peer_ids), _rcm.DEST, now)
             if LASTHEARD:
-                logger.info('LASTHEARD TS:{} TG: {:>5} {:12.12s} ID:{:8} {:25.25s}  RPT:{:8} {:20.20s} X:{}'.format(_ts, _dest, alias_tgid(_dest, talkgroup_ids), _src_sub, alias_short(_src_sub, subscriber_ids) , _src_peer, alias_call(_src_peer, peer_ids), _type))
+                logger.info('LASTHEARD TS:{} TG: {:>5} {:12.12s} ID:{:8} {:25.25s}  RPT:{:8} {:20.20s} X:{}'.format(_rcm.TS, _rcm.DEST, alias_tgid(_rcm.DEST, talkgroup_ids), _rcm.SRC_SUB, alias_short(_rcm.SRC_SUB, subscriber_ids) , _rcm.SRC_PEER, alias_call(_rcm.SRC_PEER, peer_ids), _rcm.TYPE))
         else:
-            CTABLE[_name]['PEERS'][_source][_ts]['STATUS'] = ''
-            CTABLE[_name]['PEERS'][_source][_ts]['TYPE'] = ''
-            CTABLE[_name]['PEERS'][_source][_ts]['SRC_SUB'] = ''
-            CTABLE[_name]['PEERS'][_source][_ts]['SRC_PEER'] = ''
-            CTABLE[_name]['PEERS'][_source][_ts]['DEST'] = ''
-            CTABLE[_name]['PEERS'][_source][_ts]['COLOR'] = WHITE
-            CTABLE[_name]['PEERS'][_source][_ts]['LAST'] = now
+            _slot.clear(now)
 
     elif _packettype == CALL_MON_RPT:
-        logger.debug('RCM REPEAT: {}: {}'.format(_name, repr(_data)))
-        _source   = _data[1:5]
-        _ts_state = [0, _data[5], _data[6]]
-        for i in range(1,3):
-            if _ts_state[i] == '\x01':
-                CTABLE[_name]['PEERS'][_source][i]['STATUS'] = 'Repeating'
-                CTABLE[_name]['PEERS'][_source][i]['COLOR'] = GREEN
-            elif _ts_state[i] == '\x03':
-                CTABLE[_name]['PEERS'][_source][i]['STATUS'] = 'Disabled'
-                CTABLE[_name]['PEERS'][_source][i]['COLOR'] = RED
-            elif _ts_state[i] == '\x04':
-                CTABLE[_name]['PEERS'][_source][i]['STATUS'] = 'Enabled'
-                CTABLE[_name]['PEERS'][_source][i]['COLOR'] = GREEN
-            else:
-                CTABLE[_name]['PEERS'][_source][i]['STATUS'] = ''
-                CTABLE[_name]['PEERS'][_source][i]['COLOR'] = WHITE
-            CTABLE[_name]['PEERS'][_source][i]['LAST'] = now
+        logger.debug('RCM REPEAT: {}: {}'.format(_name, repr(_rcm)))
+        _slots = [1, 2]
+        for i, _state in zip(_slots, _rcm.STATES):
+            _slot = _peer.timeslot(i)
+            _slot.STATUS, _slot.COLOR = RPT_STATES.get(_state, ('', WHITE))
+            _slot.LAST = now
 
     elif _packettype == CALL_MON_NACK:
-        logger.debug('RCM NACK: {}: {}'.format(_name, repr(_data)))
-        _source = _data[1:5]
-        _nack = _data[5]
-        if _nack == '\x05':
-            for i in range(1,3):
-                CTABLE[_name]['PEERS'][_source][i]['STATUS'] = 'BSID ON'
-                CTABLE[_name]['PEERS'][_source][i]['COLOR'] = ORANGE
-        elif _nack == '\x06':
-            for i in range(1,3):
-                CTABLE[_name]['PEERS'][_source][i]['STATUS'] = ''
-                CTABLE[_name]['PEERS'][_source][i]['COLOR'] = WHITE
-
-        for i in range(1,3):
-            #CTABLE[_name]['PEERS'][_source][i]['TYPE'] = ''
-            #CTABLE[_name]['PEERS'][_source][i]['SRC_SUB'] = ''
-            #CTABLE[_name]['PEERS'][_source][i]['SRC_PEER'] = ''
-            #CTABLE[_name]['PEERS'][_source][i]['DEST'] = ''
-            CTABLE[_name]['PEERS'][_source][i]['LAST'] = now
-    else:
-        logger.error('unknown call mon recieved: {}'.format(repr(_packettype)))
-        return
-
-    build_stats()
+        logger.debug('RCM NACK: {}: {}'.format(_name, repr(_rcm)))
+        _slots = [1, 2]
+        for i in _slots:
+            _slot = _peer.timeslot(i)
+            if _rcm.NACK == '\x05':
+                _slot.STATUS, _slot.COLOR = 'BSID ON', ORANGE
+            elif _rcm.NACK == '\x06':
+                _slot.STATUS, _slot.COLOR = '', WHITE
+            _slot.LAST = now
+
+    for _slot in _slots:
+        scheduler.mark('CTABLE', (_name, _rcm.SOURCE, _slot))
 
 # DMRlink Table Functions
 def add_peer(_stats_peers, _peer, _config_peer_data, _type):
-    now = time()
     logger.debug('Adding peer: {}'.format(repr(_peer)))
-    _stats_peers[_peer] = {}
-    _stats_peers[_peer]['TYPE'] = _type
-    _stats_peers[_peer]['RADIO_ID'] = int_id(_peer)
-    _stats_peers[_peer]['ALIAS'] = alias_string(int_id(_peer), peer_ids)
-    _stats_peers[_peer]['IP'] = _config_peer_data['IP']
-    _stats_peers[_peer]['CONNECTED'] = _config_peer_data['STATUS']['CONNECTED']
-    _stats_peers[_peer]['KEEP_ALIVES_SENT'] = _config_peer_data['STATUS']['KEEP_ALIVES_SENT']
-    _stats_peers[_peer]['KEEP_ALIVES_RECEIVED'] = _config_peer_data['STATUS']['KEEP_ALIVES_RECEIVED']
-    _stats_peers[_peer]['KEEP_ALIVES_MISSED'] = _config_peer_data['STATUS']['KEEP_ALIVES_MISSED']
-    _stats_peers[_peer][1] = {'STATUS': '', 'TYPE': '', 'SRC_PEER': '', 'SRC_SUB': '', 'DEST': '', 'COLOR': WHITE, 'LAST': now}
-    _stats_peers[_peer][2] = {'STATUS': '', 'TYPE': '', 'SRC_PEER': '', 'SRC_SUB': '', 'DEST': '', 'COLOR': WHITE, 'LAST': now}
+    _stats_peers[_peer] = PeerState(_type, _peer, alias_string(int_id(_peer), peer_ids), _config_peer_data, time())
 
+# Returns the fields that actually changed, an empty list means nothing to redraw
 def update_peer(_stats_peers, _peer, _config_peer_data):
-    logger.debug('Updating peer: {}'.format(repr(_peer)))
-    _stats_peers[_peer]['CONNECTED'] = _config_peer_data['STATUS']['CONNECTED']
-    _stats_peers[_peer]['KEEP_ALIVES_SENT'] = _config_peer_data['STATUS']['KEEP_ALIVES_SENT']
-    _stats_peers[_peer]['KEEP_ALIVES_RECEIVED'] = _config_peer_data['STATUS']['KEEP_ALIVES_RECEIVED']
-    _stats_peers[_peer]['KEEP_ALIVES_MISSED'] = _config_peer_data['STATUS']['KEEP_ALIVES_MISSED']
+    _changed = _stats_peers[_peer].update(_config_peer_data)
+    if _changed:
+        logger.debug('Updating peer: {} {}'.format(repr(_peer), _changed))
+    return _changed
 
 def delete_peers(_peers_to_delete, _stats_table_peers):
     for _peer in _peers_to_delete:
@@ -289,108 +299,414 @@ def build_dmrlink_table(_config, _stats_table):
                 add_peer(_stats_peers, _peer, _config_peer_data, 'Peer')
 
 
+# Compare a new CONFIG against the table and apply only the differences. The
+# change set that comes back says what has to be redrawn:
+#   ADDED/REMOVED: [(ipsc, peer), ...]   the table layout changed
+#   CHANGED:       {(ipsc, peer): [field, ...]}
 def update_dmrlink_table(_config, _stats_table):
+    _changes = {'ADDED': [], 'REMOVED': [], 'CHANGED': {}}
+
+    # IPSCs that went away, or swapped between master and peer mode, start over
+    for _ipsc in _stats_table.keys():
+        if _ipsc not in _config or _stats_table[_ipsc]['MASTER'] != _config[_ipsc]['LOCAL']['MASTER_PEER']:
+            _changes['REMOVED'].extend([(_ipsc, _peer) for _peer in _stats_table[_ipsc]['PEERS']])
+            del _stats_table[_ipsc]
 
     for _ipsc, _ipsc_data in _config.iteritems():
+        if _ipsc not in _stats_table:
+            build_dmrlink_table({_ipsc: _ipsc_data}, _stats_table)
+            _changes['ADDED'].extend([(_ipsc, _peer) for _peer in _stats_table[_ipsc]['PEERS']])
+            continue
         _stats_peers = _stats_table[_ipsc]['PEERS']
 
-        # if this peer is the master
+        # what the table should hold: the master (if we're not it) and every
+        # other peer except ourselves
+        _wanted = {}
         if _stats_table[_ipsc]['MASTER'] == False:
-            _peer = _config[_ipsc]['MASTER']['RADIO_ID']
-            _config_peer_data = _config[_ipsc]['MASTER']
-
-            _stats_peers[_peer]['RADIO_ID'] = int_id(_peer)
-            update_peer(_stats_peers, _peer, _config_peer_data)
-
-        # for all of the peers that are not the master... update or add
-        for _peer, _config_peer_data in _config[_ipsc]['PEERS'].iteritems():
-            if _peer != _config[_ipsc]['LOCAL']['RADIO_ID']:
-                _stats_peers = _stats_table[_ipsc]['PEERS']
-
-                # update the peer if we already have it
-                if _peer in _stats_table[_ipsc]['PEERS']:
-                    update_peer(_stats_peers, _peer, _config_peer_data)
-
-                # addit if we don't have it
-                if _peer not in _stats_table[_ipsc]['PEERS']:
-                    add_peer(_stats_peers, _peer, _config_peer_data, 'peer')
-
-        # for peers that need to be removed, never the master. This is complicated
-        peers_to_delete = []
-
-        # find any peers missing in the config update
-        for _peer, _stats_peer_data in _stats_table[_ipsc]['PEERS'].iteritems():
-            if _peer not in _config[_ipsc]['PEERS'] and _peer != _config[_ipsc]['MASTER']['RADIO_ID']:
-                peers_to_delete.append(_peer)
+            _wanted[_ipsc_data['MASTER']['RADIO_ID']] = (_ipsc_data['MASTER'], 'Master')
+        for _peer, _config_peer_data in _ipsc_data['PEERS'].iteritems():
+            if _peer != _ipsc_data['LOCAL']['RADIO_ID'] and _peer not in _wanted:
+                _wanted[_peer] = (_config_peer_data, 'peer')
+
+        # peers that left, and a master that changed hands, are removed
+        _peers_to_delete = []
+        for _peer, _stats_peer_data in _stats_peers.iteritems():
+            if _peer not in _wanted or (_stats_peer_data.TYPE == 'Master') != (_wanted[_peer][1] == 'Master'):
+                _peers_to_delete.append(_peer)
+        delete_peers(_peers_to_delete, _stats_peers)
+        _changes['REMOVED'].extend([(_ipsc, _peer) for _peer in _peers_to_delete])
+
+        for _peer, (_config_peer_data, _type) in _wanted.iteritems():
+            if _peer in _stats_peers:
+                _changed = update_peer(_stats_peers, _peer, _config_peer_data)
+                if _changed:
+                    _changes['CHANGED'][(_ipsc, _peer)] = _changed
+            else:
+                add_peer(_stats_peers, _peer, _config_peer_data, _type)
+                _changes['ADDED'].append((_ipsc, _peer))
 
-        # delte anything identified from the right part of the stats table
-        delete_peers(peers_to_delete, _stats_table[_ipsc]['PEERS'])
+    return _changes
 
 
 #
 # CONFBRIDGE TABLE FUNCTIONS
 #
+# Trigger TGIDs arrive as 3 byte strings, convert them once when a bridge
+# (or a BRIDGE_UPD for one) is received
+def normalize_triggers(system):
+    for _trigger_list in ('ON', 'OFF'):
+        if _trigger_list in system:
+            system[_trigger_list] = [int_id(_trigger) for _trigger in system[_trigger_list]]
+
 def build_bridge_table(_bridges):
     _stats_table = {}
-    _now = time()
-    _cnow = strftime('%Y-%m-%d %H:%M:%S', localtime(_now))
 
     for _bridge, _bridge_data in _bridges.iteritems():
         _stats_table[_bridge] = {}
 
         for system in _bridges[_bridge]:
-            _stats_table[_bridge][system['SYSTEM']] = {}
-            _stats_table[_bridge][system['SYSTEM']]['TS'] = system['TS']
-            _stats_table[_bridge][system['SYSTEM']]['TGID'] = int_id(system['TGID'])
-
-            if system['TO_TYPE'] == 'ON' or system['TO_TYPE'] == 'OFF':
-                if system['TIMER'] - _now > 0:
-                    _stats_table[_bridge][system['SYSTEM']]['EXP_TIME'] = int(system['TIMER'] - _now)
-                else:
-                    _stats_table[_bridge][system['SYSTEM']]['EXP_TIME'] = 'Expired'
-                if system['TO_TYPE'] == 'ON':
-                    _stats_table[_bridge][system['SYSTEM']]['TO_ACTION'] = 'Disconnect'
-                else:
-                    _stats_table[_bridge][system['SYSTEM']]['TO_ACTION'] = 'Connect'
-            else:
-                _stats_table[_bridge][system['SYSTEM']]['EXP_TIME'] = 'N/A'
-                _stats_table[_bridge][system['SYSTEM']]['TO_ACTION'] = 'None'
+            _stats_table[_bridge][system['SYSTEM']] = BridgeMemberState(system)
 
-            if system['ACTIVE'] == True:
-                _stats_table[_bridge][system['SYSTEM']]['ACTIVE'] = 'Connected'
-                _stats_table[_bridge][system['SYSTEM']]['COLOR'] = GREEN
-            elif system['ACTIVE'] == False:
-                _stats_table[_bridge][system['SYSTEM']]['ACTIVE'] = 'Disconnected'
-                _stats_table[_bridge][system['SYSTEM']]['COLOR'] = RED
+    return _stats_table
 
-            for i in range(len(system['ON'])):
-                system['ON'][i] = str(int_id(system['ON'][i]))
+#
+# COALESCING RENDER SCHEDULER
+#   Packet handlers only mark a table dirty, either as a whole or by the
+#   (ipsc, peer), (ipsc, peer, timeslot) or (bridge, system) entry that changed. Everything
+#   marked within the render window goes out once, no more often than
+#   RENDER_RATE allows: a full render when the table changed shape, otherwise
+#   a versioned 'u' delta with just the changed entries. The interval stretches
+#   further when the measured render and per-client broadcast cost would take
+#   more than RENDER_DUTY of the reactor's time.
+#
+RENDER_DUTY = 0.1
+RENDER_EWMA = 0.2
+
+TS_FIELDS     = ('STATUS', 'TYPE', 'SRC_SUB', 'SRC_PEER', 'DEST', 'COLOR')
+PEER_FIELDS   = ('ALIAS', 'IP', 'KEEP_ALIVES_SENT', 'KEEP_ALIVES_RECEIVED', 'KEEP_ALIVES_MISSED')
+BRIDGE_FIELDS = ('ACTIVE', 'COLOR', 'EXPIRES', 'TO_ACTION', 'TRIG_ON', 'TRIG_OFF')
+
+class render_scheduler(object):
+    def __init__(self, _window, _rate):
+        self.window = _window
+        self.min_interval = 1.0 / _rate if _rate > 0 else 0
+        self.dirty = {}
+        self.version = {'CTABLE': 0, 'BTABLE': 0}
+        self.pending = None
+        self.last_flush = 0
+        self.render_cost = {}
+        self.client_cost = 0
+
+    # _key of None means the whole table has to be re-rendered. When the
+    # layout changed but only some entries did, _touched lists them so the
+    # rest of the rendered fragments can be kept.
+    def mark(self, _table, _key=None, _touched=None):
+        snapshots.invalidate(_table)
+        if _key is not None:
+            fragments.touch(_table, _key)
+        elif _touched is not None:
+            for _entry in _touched:
+                fragments.touch(_table, _entry)
+        else:
+            fragments.clear(_table)
+        if _key is None:
+            self.dirty[_table] = None
+        elif self.dirty.get(_table, ()) is not None:
+            self.dirty.setdefault(_table, set()).add(_key)
+        if self.pending is None:
+            _delay = max(self.window, self.last_flush + self.interval() - time())
+            self.pending = reactor.callLater(_delay, self.flush)
+
+    def interval(self):
+        _cost = sum(self.render_cost.values()) + self.client_cost * len(dashboard_server.clients)
+        return max(self.min_interval, _cost / RENDER_DUTY)
+
+    def measure(self, _old, _new):
+        return _new if _old is None else _old + RENDER_EWMA * (_new - _old)
+
+    def flush(self):
+        if self.pending is not None and self.pending.active():
+            self.pending.cancel()
+        self.pending = None
+        if not self.dirty:
+            return
+        _tables, self.dirty = self.dirty, {}
+        self.last_flush = time()
+
+        # Nobody to send to, new clients get a snapshot of the current version
+        if not dashboard_server.clients:
+            return
+
+        for _table, _keys in _tables.iteritems():
+            stalls.stage = 'RENDER ' + _table
+            _start = time()
+            self.version[_table] += 1
+            if _keys is None:
+                _msg = render_table(_table)
+            else:
+                _msg = delta_table(_table, _keys)
+            if not _msg:
+                continue
+            _rendered = time()
+            _prepared = dashboard_server.broadcast(_msg, _table)
+            if _keys is None:
+                snapshots.store(_table, _prepared)
+            _sent = time()
+            self.render_cost[_table] = self.measure(self.render_cost.get(_table), _rendered - _start)
+            self.client_cost = self.measure(self.client_cost, (_sent - _rendered) / len(dashboard_server.clients))
+        stalls.stage = None
+        logger.debug('rendered %s, next render interval %.3fs', ', '.join(_tables), self.interval())
 
-            _stats_table[_bridge][system['SYSTEM']]['TRIG_ON'] = ', '.join(system['ON'])
+#
+# CALLS IN PROGRESS
+#   The call tracker pairs bridge START/END events. Its summary goes to the
+#   page as 'a' + {"n": total, "tg": {tgid: calls}, "p": {peer: calls}},
+#   at most once per reactor tick however many events arrived.
+#
+def call_completed(_call):
+    logger.debug('CALL %s: %s %s TS%s TG%s SUB %s %ss (reported %s)', _call['STATUS'], _call['IPSC'], _call['PEER'], _call['TS'], _call['TGID'], _call['SUB'],
+                 '-' if _call['DURATION'] is None else '{:.1f}'.format(_call['DURATION']), _call['REPORTED'])
+    traffic.add(_call)
+    leaders.add(_call)
+    if history is not None:
+        _duration = _call['DURATION'] if _call['DURATION'] is not None else _call['REPORTED']
+        history.record('CALL', _call['STATUS'], _call['IPSC'], _call['PEER'], _call['SUB'], _call['TS'], _call['TGID'], _duration=_duration, _time=_call['START'])
+
+def expire_calls():
+    if tracker.tick():
+        active_changed()
+
+def active_frame():
+    return 'a' + json.dumps(tracker.summary())
+
+def active_changed():
+    global active_pending
+    snapshots.invalidate('ACTIVE')
+    if active_pending is None:
+        active_pending = reactor.callLater(0, send_active)
+
+def send_active():
+    global active_pending
+    active_pending = None
+    if dashboard_server.clients:
+        dashboard_server.broadcast(active_frame(), 'ACTIVE')
 
-            for i in range(len(system['OFF'])):
-                system['OFF'][i] = str(int_id(system['OFF'][i]))
+#
+# EVENT LOG RING
+#   The last LOG_BUFFER lines, each tagged with a sequence number. Lines that
+#   arrive in the same reactor tick go out as a single 'l' frame:
+#       l{"s": <seq of the last line>, "l": [line, ...]}
+#   and a reconnecting page asks for ?since=<seq> to get only what it missed.
+#
+def log_frame(_lines, _seq=None):
+    _frame = {'l': _lines}
+    if _seq is not None:
+        _frame['s'] = _seq
+    return 'l' + json.dumps(_frame)
+
+class log_ring(object):
+    def __init__(self, _size):
+        self.lines = deque(maxlen=_size)
+        self.seq = 0
+        self.sent = 0
+        self.pending = None
+
+    def append(self, _line):
+        self.seq += 1
+        self.lines.append((self.seq, _line))
+        snapshots.invalidate('LOGBUF')
+        if self.pending is None:
+            self.pending = reactor.callLater(0, self.flush)
+
+    def since(self, _seq):
+        return [_line for _line_seq, _line in self.lines if _line_seq > _seq]
+
+    # Everything after _seq as one frame, None if there's nothing to send
+    def replay(self, _seq):
+        _lines = self.since(_seq)
+        if _lines:
+            return log_frame(_lines, self.seq)
+
+    def flush(self):
+        self.pending = None
+        _msg = self.replay(self.sent)
+        self.sent = self.seq
+        if _msg and dashboard_server.clients:
+            dashboard_server.broadcast(_msg)
 
-            _stats_table[_bridge][system['SYSTEM']]['TRIG_OFF'] = ', '.join(system['OFF'])
+#
+# SHARED SNAPSHOT CACHE
+#   What a connecting client is sent: both tables and the log replay as one
+#   frame, each rendered and framed once and shared by every client until the
+#   data behind it changes. Tables are also tied to the scheduler version so a
+#   cached snapshot never claims a version the deltas have moved past.
+#
+class snapshot_cache(object):
+    def __init__(self):
+        self.cache = {}
+        self.hits = 0
+        self.misses = 0
+
+    def invalidate(self, _key):
+        self.cache.pop(_key, None)
+
+    def store(self, _key, _prepared):
+        self.cache[_key] = (scheduler.version.get(_key), _prepared)
+
+    def get(self, _key):
+        _entry = self.cache.get(_key)
+        if _entry and _entry[0] == scheduler.version.get(_key):
+            self.hits += 1
+            return _entry[1]
+        self.misses += 1
+        stalls.stage = 'SNAPSHOT ' + _key
+        if _key == 'LOGBUF':
+            _msg = LOGBUF.replay(0)
+        elif _key == 'ACTIVE':
+            _msg = active_frame()
+        else:
+            _msg = render_table(_key)
+        stalls.stage = None
+        if not _msg:
+            return None
+        if isinstance(_msg, unicode):
+            _msg = _msg.encode('utf8')
+        self.store(_key, dashboard_server.prepareMessage(_msg))
+        return self.cache[_key][1]
+
+# Full snapshot of a table, tagged with the version the deltas continue from.
+# Only the fragments whose entries changed since they were cached are rendered.
+def render_table(_table):
+    _start = time()
+    if _table == 'CTABLE' and CONFIG:
+        _body = u''.join([fragments.get('CTABLE', (_ipsc,), _ipsc_data, render_ipsc, _ipsc, _ipsc_data) for _ipsc, _ipsc_data in CTABLE.iteritems()])
+        fragments.prune('CTABLE')
+        _msg = 'd' + dtemplate.render(_body=Markup(_body), _version=scheduler.version['CTABLE'])
+        RENDER_TIME.observe(time() - _start, ('dmrlink_table.html',))
+        return _msg
+    if _table == 'BTABLE' and BRIDGES:
+        _body = u''.join([fragments.get('BTABLE', (_bridge,), _bridge_data, render_bridge, _bridge, _bridge_data) for _bridge, _bridge_data in BTABLE['BRIDGES'].iteritems()])
+        fragments.prune('BTABLE')
+        _msg = 'b' + btemplate.render(_body=Markup(_body), _version=scheduler.version['BTABLE'])
+        RENDER_TIME.observe(time() - _start, ('bridge_table.html',))
+        return _msg
+
+def render_ipsc(_ipsc, _ipsc_data):
+    _peers = [fragments.get('CTABLE', (_ipsc, _peer), _peer_data, render_peer, _ipsc, _peer, _peer_data) for _peer, _peer_data in _ipsc_data['PEERS'].iteritems()]
+    return itemplate.render(_ipsc=_ipsc, _ipsc_data=_ipsc_data) + u''.join(_peers) + u'</tr>\n'
+
+def render_peer(_ipsc, _peer, _peer_data):
+    return ptemplate.render(_ipsc=_ipsc, _peer=_peer, _peer_data=_peer_data)
+
+# The timer text is only right when rendered, the page counts it down from
+# data-expires straight away
+def render_bridge(_bridge, _bridge_data):
+    return gtemplate.render(_bridge=_bridge, _bridge_data=_bridge_data, _now=time())
 
-    return _stats_table
+#
+# TABLE FRAGMENT CACHE
+#   The tables are put together from the rendered HTML of each IPSC and peer
+#   (CTABLE) and each bridge (BTABLE). Marking an entry bumps the stamp of the
+#   fragments it is part of, a fragment is only rendered again when its stamp
+#   moved on or the object behind it was replaced. Keys are the table name
+#   followed by (ipsc,), (ipsc, peer) or (bridge,).
+#
+FRAGMENT_TEMPLATES = {('CTABLE', 1): 'dmrlink_ipsc.html', ('CTABLE', 2): 'dmrlink_peer.html', ('BTABLE', 1): 'bridge_group.html'}
+
+class fragment_cache(object):
+    def __init__(self):
+        self.stamps = {}
+        # key: (object, stamp, html)
+        self.cache = {}
+        # fragments used and rendered by the render in progress
+        self.used = set()
+        self.rendered = set()
+
+    # _key is an entry as the scheduler marks it, every fragment holding it changes
+    def touch(self, _table, _key):
+        if _table == 'CTABLE':
+            _keys = ((_table, _key[0]), (_table, _key[0], _key[1]))
+        else:
+            _keys = ((_table, _key[0]),)
+        for _fragment in _keys:
+            self.stamps[_fragment] = self.stamps.get(_fragment, 0) + 1
+
+    def clear(self, _table):
+        for _fragment in [_fragment for _fragment in self.cache if _fragment[0] == _table]:
+            del self.cache[_fragment]
+
+    def get(self, _table, _key, _obj, _render, *_args):
+        _fragment = (_table,) + _key
+        _template = FRAGMENT_TEMPLATES[(_table, len(_key))]
+        self.used.add(_fragment)
+        _stamp = self.stamps.get(_fragment, 0)
+        _entry = self.cache.get(_fragment)
+        if _entry is not None and _entry[0] is _obj and _entry[1] == _stamp:
+            FRAGMENTS.inc((_template, 'hit'))
+            return _entry[2]
+        FRAGMENTS.inc((_template, 'render'))
+        self.rendered.add(_fragment)
+        _start = time()
+        _html = _render(*_args)
+        RENDER_TIME.observe(time() - _start, (_template,))
+        self.cache[_fragment] = (_obj, _stamp, _html)
+        return _html
+
+    # Forget the fragments of entries that are gone, after a full render. A
+    # peer is only known to be gone if its IPSC was rendered without it, a
+    # cached IPSC never looked at its peers.
+    def prune(self, _table):
+        for _fragment in [_fragment for _fragment in self.cache if _fragment[0] == _table and _fragment not in self.used
+                          and (_fragment[:2] not in self.used or _fragment[:2] in self.rendered)]:
+            del self.cache[_fragment]
+            self.stamps.pop(_fragment, None)
+        self.used = set()
+        self.rendered = set()
+
+# Changed entries only, keyed the same way the templates build their cell ids
+def delta_table(_table, _keys):
+    _start = time()
+    _cells = []
+    if _table == 'CTABLE':
+        _opcode = 'd'
+        for _key in _keys:
+            try:
+                _data = CTABLE[_key[0]]['PEERS'][_key[1]]
+            except KeyError:
+                continue
+            if len(_key) == 2:
+                _cell = {'k': '{}-{}'.format(h(_key[0]), h(_key[1])), 'COLOR': RED if _data.CONNECTED == False else GREEN}
+                for _field in PEER_FIELDS:
+                    _cell[_field] = getattr(_data, _field)
+            else:
+                _data = _data.timeslot(_key[2])
+                _cell = {'k': '{}-{}-{}'.format(h(_key[0]), h(_key[1]), _key[2])}
+                for _field in TS_FIELDS:
+                    _cell[_field] = getattr(_data, _field)
+            _cells.append(_cell)
+    else:
+        _opcode = 'b'
+        for _bridge, _system in _keys:
+            try:
+                _data = BTABLE['BRIDGES'][_bridge][_system]
+            except KeyError:
+                continue
+            _cell = {'k': '{}-{}'.format(h(_bridge), h(_system))}
+            for _field in BRIDGE_FIELDS:
+                _cell[_field] = getattr(_data, _field)
+            _cells.append(_cell)
+    _msg = 'u' + json.dumps({'t': _opcode, 'v': scheduler.version[_table], 'c': _cells})
+    RENDER_TIME.observe(time() - _start, ('dmrlink_delta' if _opcode == 'd' else 'bridge_delta',))
+    return _msg
 
 #
 # BUILD DMRLINK AND CONFBRIDGE TABLES FROM CONFIG/BRIDGES DICTS
-#          THIS CURRENTLY IS A TIMED CALL
+#          THIS CURRENTLY IS A TIMED CALL, IT ONLY DOES WORK WHEN A TABLE
+#          HAS BEEN MARKED DIRTY AND THE RENDER SCHEDULER HASN'T GOT TO IT
 #
-build_time = time()
 def build_stats():
-    global build_time
-    now = time()
-    if True: #now > build_time + 1:
-        if CONFIG:
-            table = 'd' + dtemplate.render(_table=CTABLE)
-            dashboard_server.broadcast(table)
-        if BRIDGES:
-            table = 'b' + btemplate.render(_table=BTABLE['BRIDGES'])
-            dashboard_server.broadcast(table)
-        build_time = now
+    if scheduler.dirty:
+        scheduler.flush()
 
 def timeout_clients():
     now = time()
@@ -409,24 +725,24 @@ def timeout_clients():
 # PROCESS INCOMING MESSAGES AND TAKE THE CORRECT ACTION DEPENING ON THE OPCODE
 #
 def process_message(_message):
-    global CONFIG, BRIDGES, CONFIG_RX, BRIDGES_RX
     opcode = _message[:1]
     _now = strftime('%Y-%m-%d %H:%M:%S %Z', localtime(time()))
-    logger.debug('got opcode: {}, message: {}'.format(repr(opcode), repr(_message[1:])))
+    # repr() of a big CONFIG_SND pickle is expensive, only do it if it gets logged
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug('got opcode: {}, message: {}'.format(repr(opcode), repr(_message[1:])))
 
     if opcode == OPCODE['CONFIG_SND']:
         logger.debug('got CONFIG_SND opcode')
-        CONFIG = load_dictionary(_message)
-        CONFIG_RX = strftime('%Y-%m-%d %H:%M:%S', localtime(time()))
-        if CTABLE:
-            update_dmrlink_table(CONFIG, CTABLE)
-        else:
-            build_dmrlink_table(CONFIG, CTABLE)
+        decoder.submit('CONFIG_SND', _message, config_received)
     elif opcode == OPCODE['BRIDGE_SND']:
         logger.debug('got BRIDGE_SND opcode')
-        BRIDGES = load_dictionary(_message)
-        BRIDGES_RX = strftime('%Y-%m-%d %H:%M:%S', localtime(time()))
-        BTABLE['BRIDGES'] = build_bridge_table(BRIDGES)
+        decoder.submit('BRIDGE_SND', _message, bridges_received)
+    elif opcode == OPCODE['CONFIG_UPD']:
+        logger.debug('got CONFIG_UPD opcode')
+        decoder.update('CONFIG_SND', _message, config_updated)
+    elif opcode == OPCODE['BRIDGE_UPD']:
+        logger.debug('got BRIDGE_UPD opcode')
+        decoder.update('BRIDGE_SND', _message, bridges_updated)
 
     elif opcode == OPCODE['LINK_EVENT']:
         logger.info('LINK_EVENT Received: {}'.format(repr(_message[1:])))
@@ -449,32 +765,285 @@ def process_message(_message):
         else:
             log_message = '{}: UNKNOWN LOG MESSAGE'.format(_now)
 
-        dashboard_server.broadcast('l' + log_message)
         LOGBUF.append(log_message)
+        if p[0] == 'GROUP VOICE' and len(p) > 7:
+            _key = (p[2], int(p[4]), int(p[6]), int(p[7]))
+            if p[1] == 'START':
+                tracker.start(_key, int(p[5]))
+            elif p[1] == 'END':
+                tracker.end(_key, int(p[5]), float(p[8]))
+            elif p[1] == 'END WITHOUT MATCHING START':
+                tracker.end(_key, int(p[5]))
+            active_changed()
     else:
         logger.debug('got unknown opcode: {}, message: {}'.format(repr(opcode), repr(_message[1:])))
 
 
+def config_received(_config):
+    global CONFIG, CONFIG_RX
+    CONFIG = _config
+    CONFIG_RX = strftime('%Y-%m-%d %H:%M:%S', localtime(time()))
+    if not CTABLE:
+        build_dmrlink_table(CONFIG, CTABLE)
+        scheduler.mark('CTABLE')
+        return
+    _changes = update_dmrlink_table(CONFIG, CTABLE)
+    if _changes['ADDED'] or _changes['REMOVED']:
+        logger.debug('CONFIG_SND: %s peers added, %s removed', len(_changes['ADDED']), len(_changes['REMOVED']))
+        scheduler.mark('CTABLE', _touched=_changes['ADDED'] + _changes['REMOVED'] + list(_changes['CHANGED']))
+    else:
+        for _key in _changes['CHANGED']:
+            scheduler.mark('CTABLE', _key)
+
+def bridges_received(_bridges):
+    global BRIDGES, BRIDGES_RX
+    BRIDGES = _bridges
+    BRIDGES_RX = strftime('%Y-%m-%d %H:%M:%S', localtime(time()))
+    for _bridge in BRIDGES:
+        for system in BRIDGES[_bridge]:
+            normalize_triggers(system)
+
+    # Same bridges and systems: update them in place and send only the
+    # entries that changed, if any
+    _table = BTABLE['BRIDGES']
+    if not _table or set(_table) != set(BRIDGES) or any(set(_table[_bridge]) != set(system['SYSTEM'] for system in BRIDGES[_bridge]) for _bridge in BRIDGES):
+        BTABLE['BRIDGES'] = build_bridge_table(BRIDGES)
+        scheduler.mark('BTABLE')
+        return
+    for _bridge, _systems in BRIDGES.iteritems():
+        for system in _systems:
+            if _table[_bridge][system['SYSTEM']].load(system):
+                scheduler.mark('BTABLE', (_bridge, system['SYSTEM']))
+
+#
+# INCREMENTAL UPDATES
+#   CONFIG_UPD carries a pickled subset of CONFIG:
+#       {ipsc: {'MASTER': {...}, 'PEERS': {peer_id: {...} or None}}}
+#   where each peer holds only the keys that changed (usually its 'STATUS'
+#   counters) and None removes the peer. BRIDGE_UPD carries
+#       {bridge: [{'SYSTEM': name, ...changed keys...}]}
+#   matched to BRIDGES entries by SYSTEM. Only the touched table entries are
+#   patched and marked, periodic *_SND checkpoints still replace everything.
+#   A peer or system we don't know yet is only added if its update holds
+#   everything the table shows for it, otherwise it waits for the checkpoint.
+#
+def merge_update(_target, _update):
+    for _key, _value in _update.iteritems():
+        if isinstance(_value, dict) and isinstance(_target.get(_key), dict):
+            merge_update(_target[_key], _value)
+        else:
+            _target[_key] = _value
+
+def config_updated(_update):
+    for _ipsc, _ipsc_update in _update.iteritems():
+        if _ipsc not in CONFIG or _ipsc not in CTABLE:
+            logger.debug('CONFIG_UPD for unknown IPSC %s, waiting for the next CONFIG_SND', _ipsc)
+            continue
+        _config_ipsc = CONFIG[_ipsc]
+        _stats_peers = CTABLE[_ipsc]['PEERS']
+
+        if 'MASTER' in _ipsc_update and CTABLE[_ipsc]['MASTER'] == False:
+            merge_update(_config_ipsc['MASTER'], _ipsc_update['MASTER'])
+            _peer = _config_ipsc['MASTER']['RADIO_ID']
+            if _peer in _stats_peers and update_peer(_stats_peers, _peer, _config_ipsc['MASTER']):
+                scheduler.mark('CTABLE', (_ipsc, _peer))
+
+        for _peer, _peer_update in _ipsc_update.get('PEERS', {}).iteritems():
+            if _peer == _config_ipsc['LOCAL']['RADIO_ID']:
+                continue
+            if _peer_update is None:
+                _config_ipsc['PEERS'].pop(_peer, None)
+                if _peer in _stats_peers and _peer != _config_ipsc['MASTER']['RADIO_ID']:
+                    delete_peers([_peer], _stats_peers)
+                    scheduler.mark('CTABLE', _touched=[(_ipsc, _peer)])
+            elif _peer in _config_ipsc['PEERS']:
+                merge_update(_config_ipsc['PEERS'][_peer], _peer_update)
+                if _peer in _stats_peers and update_peer(_stats_peers, _peer, _config_ipsc['PEERS'][_peer]):
+                    scheduler.mark('CTABLE', (_ipsc, _peer))
+            elif not PeerState.complete(_peer_update):
+                logger.debug('CONFIG_UPD for unknown peer %s on %s is partial, waiting for the next CONFIG_SND', _peer, _ipsc)
+            else:
+                _config_ipsc['PEERS'][_peer] = _peer_update
+                add_peer(_stats_peers, _peer, _peer_update, 'peer')
+                scheduler.mark('CTABLE', _touched=[(_ipsc, _peer)])
+
+def bridges_updated(_update):
+    for _bridge, _systems in _update.iteritems():
+        if _bridge not in BRIDGES:
+            logger.debug('BRIDGE_UPD for unknown bridge %s, waiting for the next BRIDGE_SND', _bridge)
+            continue
+        for _system_update in _systems:
+            normalize_triggers(_system_update)
+            for system in BRIDGES[_bridge]:
+                if system['SYSTEM'] == _system_update['SYSTEM']:
+                    merge_update(system, _system_update)
+                    if BTABLE['BRIDGES'][_bridge][system['SYSTEM']].load(system):
+                        scheduler.mark('BTABLE', (_bridge, system['SYSTEM']))
+                    break
+            else:
+                if not BridgeMemberState.complete(_system_update):
+                    logger.debug('BRIDGE_UPD for unknown system %s on %s is partial, waiting for the next BRIDGE_SND', _system_update['SYSTEM'], _bridge)
+                    continue
+                BRIDGES[_bridge].append(_system_update)
+                BTABLE['BRIDGES'][_bridge][_system_update['SYSTEM']] = BridgeMemberState(_system_update)
+                scheduler.mark('BTABLE', _touched=[(_bridge, _system_update['SYSTEM'])])
+
+# Ask DMRlink for full CONFIG_SND/BRIDGE_SND checkpoints
+def request_checkpoint():
+    if dmrlink is not None:
+        logger.debug('requesting CONFIG/BRIDGE checkpoint from DMRlink')
+        dmrlink.sendString(OPCODE['CONFIG_REQ'])
+        dmrlink.sendString(OPCODE['BRIDGE_REQ'])
+
+#
+# DECODING CONFIG_SND/BRIDGE_SND PAYLOADS
+#   The pickles only ever hold plain containers and scalars, so the unpickler
+#   refuses every global that isn't on SAFE_GLOBALS. Large payloads are decoded
+#   in a worker thread and applied back on the reactor, a payload that has been
+#   overtaken by a newer one of the same kind is dropped when it finishes.
+#   *_UPD payloads are small and decoded in place, but are held back while a
+#   *_SND of the same kind is still decoding so they land on top of it.
+#
+SAFE_GLOBALS = {
+    ('__builtin__', 'set'),
+    ('__builtin__', 'frozenset'),
+    ('collections', 'deque'),
+    ('collections', 'OrderedDict')
+}
+
+def safe_global(_module, _name):
+    if (_module, _name) not in SAFE_GLOBALS:
+        raise UnpicklingError('{}.{} is not allowed in a DMRlink payload'.format(_module, _name))
+    return getattr(__import__(_module), _name)
+
 def load_dictionary(_message):
-    data = _message[1:]
-    return loads(data)
-    logger.debug('Successfully decoded dictionary')
+    _unpickler = Unpickler(StringIO(_message[1:]))
+    _unpickler.find_global = safe_global
+    return _unpickler.load()
+
+class payload_decoder(object):
+    # Payloads over _limit bytes are logged and thrown away undecoded
+    def __init__(self, _limit):
+        self.limit = _limit
+        self.generation = {}
+        self.decoding = set()
+        self.held = {}
+        self.stats = {}
+
+    def submit(self, _opcode, _message, _apply):
+        if self.oversize(_opcode, _message):
+            return
+        _generation = self.generation.get(_opcode, 0) + 1
+        self.generation[_opcode] = _generation
+        self.decoding.add(_opcode)
+        d = threads.deferToThread(self.decode, _message)
+        d.addCallbacks(self.decoded, self.failed, callbackArgs=(_opcode, _generation, _apply), errbackArgs=(_opcode, _generation))
+        return d
+
+    # Runs in the worker thread
+    def decode(self, _message):
+        _start = time()
+        _data = load_dictionary(_message)
+        return _data, len(_message), time() - _start
+
+    # _opcode is the *_SND this update belongs on top of
+    def update(self, _opcode, _message, _apply):
+        if self.oversize(_opcode[:-3] + 'UPD', _message):
+            return
+        try:
+            _data, _bytes, _seconds = self.decode(_message)
+        except Exception as e:
+            logger.error('could not decode update to %s: %s', _opcode, e)
+            return
+        self.record(_opcode[:-3] + 'UPD', _bytes, _seconds)
+        if _opcode in self.decoding:
+            self.held.setdefault(_opcode, []).append((_apply, _data))
+        else:
+            self.apply(_opcode[:-3] + 'UPD', _apply, _data)
+
+    def oversize(self, _opcode, _message):
+        if len(_message) <= self.limit:
+            return False
+        self.opcode_stats(_opcode)['REJECTED'] += 1
+        logger.error('rejected %s of %s bytes, over the %s byte MAX_PAYLOAD', _opcode, len(_message), self.limit)
+        return True
+
+    def opcode_stats(self, _opcode):
+        return self.stats.setdefault(_opcode, {'COUNT': 0, 'DROPPED': 0, 'REJECTED': 0, 'SECONDS': 0.0, 'LAST_SECONDS': 0.0, 'LAST_BYTES': 0})
+
+    def record(self, _opcode, _bytes, _seconds):
+        _stats = self.opcode_stats(_opcode)
+        _stats['COUNT'] += 1
+        _stats['SECONDS'] += _seconds
+        _stats['LAST_SECONDS'] = _seconds
+        _stats['LAST_BYTES'] = _bytes
+        DECODE_TIME.observe(_seconds, (_opcode,))
+        logger.debug('decoded %s: %s bytes in %.6fs', _opcode, _bytes, _seconds)
+        return _stats
+
+    def decoded(self, _result, _opcode, _generation, _apply):
+        _data, _bytes, _seconds = _result
+        _stats = self.record(_opcode, _bytes, _seconds)
+        if _generation != self.generation[_opcode]:
+            _stats['DROPPED'] += 1
+            logger.debug('dropping stale %s, a newer one arrived while decoding', _opcode)
+            return
+        stalls.stage = _opcode + ' applying'
+        try:
+            self.apply(_opcode, _apply, _data)
+        finally:
+            self.release(_opcode)
+            stalls.stage = None
+
+    def failed(self, _failure, _opcode, _generation):
+        logger.error('could not decode %s: %s', _opcode, _failure.getErrorMessage())
+        if _generation == self.generation[_opcode]:
+            self.release(_opcode)
+
+    # Apply the updates that arrived while the latest *_SND was decoding
+    def release(self, _opcode):
+        self.decoding.discard(_opcode)
+        for _apply, _data in self.held.pop(_opcode, []):
+            self.apply(_opcode[:-3] + 'UPD', _apply, _data)
+
+    # One payload that can't be applied mustn't hold up the ones after it
+    def apply(self, _opcode, _apply, _data):
+        try:
+            _apply(_data)
+        except Exception:
+            logger.exception('could not apply %s', _opcode)
 
 #
 # COMMUNICATION WITH THE DMRLINK INSTANCE
 #
+dmrlink = None
+
 class report(NetstringReceiver):
     def __init__(self):
         pass
 
     def connectionMade(self):
-        pass
+        global dmrlink
+        dmrlink = self
 
     def connectionLost(self, reason):
-        pass
+        global dmrlink
+        if dmrlink is self:
+            dmrlink = None
 
     def stringReceived(self, data):
-        process_message(data)
+        if capture is not None:
+            capture.write(data)
+        dmrlink_message(data)
+
+# Everything from DMRlink comes through here, live or replayed from a capture
+def dmrlink_message(data):
+    _opcode = (OPCODE_NAMES.get(data[:1], 'UNKNOWN'),)
+    MSG_COUNT.inc(_opcode)
+    MSG_BYTES.inc(_opcode, len(data))
+    stalls.stage = _opcode[0]
+    process_message(data)
+    stalls.stage = None
 
 
 class reportClientFactory(ReconnectingClientFactory):
@@ -490,12 +1059,19 @@ class reportClientFactory(ReconnectingClientFactory):
         logger.info('Connected.')
         logger.info('Resetting reconnection delay')
         self.resetDelay()
+        self.resync()
         return report()
 
     def clientConnectionLost(self, connector, reason):
         logger.info('Lost connection.  Reason: %s', reason)
         ReconnectingClientFactory.clientConnectionLost(self, connector, reason)
         dashboard_server.broadcast('q' + 'Connection to DMRlink Lost')
+        self.resync()
+
+    # Pages clear their tables on a 'q', the next flush sends them whole
+    def resync(self):
+        scheduler.mark('CTABLE')
+        scheduler.mark('BTABLE')
 
     def clientConnectionFailed(self, connector, reason):
         logger.info('Connection failed. Reason: %s', reason)
@@ -505,26 +1081,102 @@ class reportClientFactory(ReconnectingClientFactory):
 #
 # WEBSOCKET COMMUNICATION WITH THE DASHBOARD CLIENT
 #
+@implementer(IPushProducer)
 class dashboard(WebSocketServerProtocol):
 
     def onConnect(self, request):
         logger.info('Client connecting: %s', request.peer)
+        # A page that reconnects tells us the last log line it has
+        self.since = None
+        try:
+            self.since = int(request.params['since'][0])
+        except (KeyError, IndexError, ValueError):
+            pass
 
     def onOpen(self):
         logger.info('WebSocket connection open.')
+        # Outbound state: the transport pauses us when its buffer backs up
+        self.paused_since = None
+        self.stale_tables = set()
+        self.queue = deque()
+        self.skipped = 0
+        self.registerProducer(self, True)
         self.factory.register(self)
-        self.sendMessage('d' + str(dtemplate.render(_table=CTABLE)))
-        self.sendMessage('b' + str(btemplate.render(_table=BTABLE['BRIDGES'])))
-        for _message in LOGBUF:
-            if _message:
-                self.sendMessage('l' + _message)
+        # Our clock, so the page can count bridge timers down without skew
+        self.sendMessage('t{:.3f}'.format(time()))
+        self.send_snapshot('CTABLE')
+        self.send_snapshot('BTABLE')
+        self.send_snapshot('ACTIVE')
+        if self.since is None or self.since > LOGBUF.seq:
+            self.send_snapshot('LOGBUF')
+        else:
+            _msg = LOGBUF.replay(self.since)
+            if _msg:
+                self.sendMessage(_msg)
 
     def onMessage(self, payload, isBinary):
         if isBinary:
             logger.info('Binary message received: %s bytes', len(payload))
+        elif payload == 'rd':
+            logger.debug('Client %s out of step, resending DMRlink table', self.peer)
+            self.stale_tables.add('CTABLE')
+            self.drain()
+        elif payload == 'rb':
+            logger.debug('Client %s out of step, resending bridge table', self.peer)
+            self.stale_tables.add('BTABLE')
+            self.drain()
         else:
             logger.info('Text message received: %s', payload.decode('utf8'))
 
+    def send_snapshot(self, _key):
+        _prepared = snapshots.get(_key)
+        if _prepared:
+            self.sendPreparedMessage(_prepared)
+
+    # Broadcasts land here. While the transport has us paused, table updates
+    # collapse into "send a fresh snapshot later" and everything else waits in
+    # a bounded queue that drops the oldest lines first.
+    def deliver(self, _prepared, _table=None):
+        if self.paused_since is None:
+            self.sendPreparedMessage(_prepared)
+            return
+        if time() - self.paused_since > SLOW_CLIENT:
+            logger.info('SLOW CLIENT: disconnecting %s, no progress for %s seconds', self.peer, SLOW_CLIENT)
+            self.factory.unregister(self)
+            self.dropConnection(abort=True)
+            return
+        if _table:
+            self.stale_tables.add(_table)
+            return
+        if len(self.queue) >= CLIENT_QUEUE:
+            self.queue.popleft()
+            self.skipped += 1
+        self.queue.append(_prepared)
+
+    def drain(self):
+        while self.paused_since is None and self.stale_tables:
+            self.send_snapshot(self.stale_tables.pop())
+        if self.paused_since is None and self.skipped:
+            self.sendMessage(log_frame(['{} messages skipped'.format(self.skipped)]))
+            self.skipped = 0
+        while self.paused_since is None and self.queue:
+            self.sendPreparedMessage(self.queue.popleft())
+
+    def pauseProducing(self):
+        if self.paused_since is None:
+            logger.debug('Client %s is falling behind, holding updates', self.peer)
+            self.paused_since = time()
+
+    def resumeProducing(self):
+        if self.paused_since is not None:
+            logger.debug('Client %s caught up after %.1fs', self.peer, time() - self.paused_since)
+            self.paused_since = None
+            self.drain()
+
+    def stopProducing(self):
+        self.queue.clear()
+        self.stale_tables.clear()
+
     def connectionLost(self, reason):
         WebSocketServerProtocol.connectionLost(self, reason)
         self.factory.unregister(self)
@@ -538,6 +1190,7 @@ class dashboardFactory(WebSocketServerFactory):
     def __init__(self, url):
         WebSocketServerFactory.__init__(self, url)
         self.clients = []
+        self.stats = {'BROADCASTS': 0, 'BYTES': 0, 'SECONDS': 0.0, 'LAST': {'BYTES': 0, 'CLIENTS': 0, 'SECONDS': 0.0}}
 
     def register(self, client):
         if client not in self.clients:
@@ -549,11 +1202,27 @@ class dashboardFactory(WebSocketServerFactory):
             logger.info('unregistered client %s', client.peer)
             self.clients.remove(client)
 
-    def broadcast(self, msg):
-        logger.debug('broadcasting message to: %s', self.clients)
-        for c in self.clients:
-            c.sendMessage(msg.encode('utf8'))
-            logger.debug('message sent to %s', c.peer)
+    # Encode and frame once, every client gets the same prepared bytes.
+    # Table updates name their _table so slow clients can collapse them.
+    def broadcast(self, msg, _table=None):
+        _start = time()
+        if isinstance(msg, unicode):
+            msg = msg.encode('utf8')
+        _prepared = self.prepareMessage(msg)
+        for c in list(self.clients):
+            c.deliver(_prepared, _table)
+        _elapsed = time() - _start
+
+        _last = self.stats['LAST']
+        _last['BYTES'] = len(msg)
+        _last['CLIENTS'] = len(self.clients)
+        _last['SECONDS'] = _elapsed
+        FANOUT.observe(_last['CLIENTS'])
+        self.stats['BROADCASTS'] += 1
+        self.stats['BYTES'] += _last['BYTES'] * _last['CLIENTS']
+        self.stats['SECONDS'] += _elapsed
+        logger.debug('broadcast %s bytes to %s clients in %.6fs', _last['BYTES'], _last['CLIENTS'], _elapsed)
+        return _prepared
 # experiment timeout_clients
     def timeout(self, client):
        logger.debug('check timeout message to: %s', self.clients)
@@ -573,29 +1242,182 @@ class dashboardFactory(WebSocketServerFactory):
 #
 # STATIC WEBSERVER
 #
-class web_server(Resource):
-    isLeaf = True
-    def render_GET(self, request):
-        logger.info('static website requested: %s', request)
-        if WEBAUTH:
-          user = WEBUSER.encode('utf-8')
-          password = WEBPASS.encode('utf-8')
-          auth = request.getHeader('Authorization')
-          if auth and auth.split(' ')[0] == 'Basic':
-             decodeddata = base64.b64decode(auth.split(' ')[1])
-             if decodeddata.split(b':') == [user, password]:
-                 logger.info('Authorization OK')
-                 return (index_html).encode('utf-8')
-          request.setResponseCode(401)
-          request.setHeader('WWW-Authenticate', 'Basic realm="realmname"')
-          logger.info('Someone wanted to get access without authorization')
-          return "<html<head></hread><body style=\"background-color: #EEEEEE;\"><br><br><br><center> \
+UNAUTHORIZED = "<html<head></hread><body style=\"background-color: #EEEEEE;\"><br><br><br><center> \
                     <fieldset style=\"width:600px;background-color:#e0e0e0e0;text-algin: center; margin-left:15px;margin-right:15px; \
                      font-size:14px;border-top-left-radius: 10px; border-top-right-radius: 10px; \
                      border-bottom-left-radius: 10px; border-bottom-right-radius: 10px;\"> \
                   <p><font size=5><b>Authorization Required</font></p></filed></center></body></html>".encode('utf-8')
-        else:
-            return (index_html).encode('utf-8')
+
+# Basic auth shared by every page: True if the request may go ahead,
+# otherwise the 401 has been set up and the caller returns UNAUTHORIZED
+def authorized(request):
+    if not WEBAUTH:
+        return True
+    user = WEBUSER.encode('utf-8')
+    password = WEBPASS.encode('utf-8')
+    auth = request.getHeader('Authorization')
+    if auth and auth.split(' ')[0] == 'Basic':
+       decodeddata = base64.b64decode(auth.split(' ')[1])
+       if decodeddata.split(b':') == [user, password]:
+           logger.info('Authorization OK')
+           return True
+    request.setResponseCode(401)
+    request.setHeader('WWW-Authenticate', 'Basic realm="realmname"')
+    logger.info('Someone wanted to get access without authorization')
+    return False
+
+class web_server(Resource):
+    isLeaf = False
+
+    # Anything that isn't one of the pages below gets the dashboard
+    def getChild(self, name, request):
+        return self
+
+    def render_GET(self, request):
+        logger.info('static website requested: %s', request)
+        if not authorized(request):
+            return UNAUTHORIZED
+        return (index_html).encode('utf-8')
+
+# Times for the JSON pages: seconds since the epoch or local date/time
+TIME_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d')
+
+def parse_time(_value):
+    try:
+        return float(_value)
+    except ValueError:
+        pass
+    for _format in TIME_FORMATS:
+        try:
+            return mktime(strptime(_value, _format))
+        except ValueError:
+            pass
+    raise ValueError('unrecognised time: {}'.format(_value))
+
+def json_response(request, _data):
+    request.setHeader('Content-Type', 'application/json')
+    return json.dumps(_data).encode('utf-8')
+
+# /history?tgid=3100&since=2020-06-02&until=2020-06-03
+#   Optional source (CALL or RCM), tgid, sub, peer, since, until and limit,
+#   newest row first
+class history_page(Resource):
+    isLeaf = True
+
+    def render_GET(self, request):
+        if not authorized(request):
+            return UNAUTHORIZED
+        try:
+            _args = {}
+            for _arg in ('tgid', 'sub', 'peer', 'limit'):
+                if _arg in request.args:
+                    _args[_arg] = int(request.args[_arg][0])
+            for _arg in ('since', 'until'):
+                if _arg in request.args:
+                    _args[_arg] = parse_time(request.args[_arg][0])
+            if 'source' in request.args:
+                _args['source'] = request.args['source'][0].upper()
+                if _args['source'] not in ('CALL', 'RCM'):
+                    raise ValueError('source must be CALL or RCM')
+            # SQLite takes a negative LIMIT as no limit at all
+            if _args.get('limit', 1) < 1:
+                raise ValueError('limit must be at least 1')
+        except ValueError as e:
+            request.setResponseCode(400)
+            return json_response(request, {'error': str(e)})
+        _args['limit'] = min(_args.get('limit', 100), HISTORY_LIMIT)
+
+        d = history.query(**_args)
+        d.addCallback(self.send, request)
+        d.addErrback(self.failed, request)
+        return NOT_DONE_YET
+
+    def send(self, _rows, request):
+        for _row in _rows:
+            _row['SUB_ALIAS'] = alias_short(_row['SUB'], subscriber_ids)
+            _row['PEER_ALIAS'] = alias_call(_row['PEER'], peer_ids)
+            _row['TGID_ALIAS'] = alias_tgid(_row['TGID'], talkgroup_ids)
+        request.write(json_response(request, _rows))
+        request.finish()
+
+    def failed(self, _failure, request):
+        logger.error('history query failed: %s', _failure.getErrorMessage())
+        request.setResponseCode(500)
+        request.write(json_response(request, {'error': 'query failed'}))
+        request.finish()
+
+# /top?window=1h                     top 10 subscribers, talkgroups and peers
+# /top?window=5m&by=sub&metric=airtime&tg=3100&k=20
+#   window 5m, 1h or 24h; by sub, tg or peer; metric airtime or calls; tg
+#   ranks the subscribers on one talkgroup. Each entry is [id, count, error,
+#   alias], count may be over by as much as error.
+TOP_ALIASES = {'sub': lambda _id: alias_short(_id, subscriber_ids), 'tg': lambda _id: alias_tgid(_id, talkgroup_ids), 'peer': lambda _id: alias_call(_id, peer_ids)}
+
+class top_page(Resource):
+    isLeaf = True
+
+    def render_GET(self, request):
+        if not authorized(request):
+            return UNAUTHORIZED
+        _arg = lambda _name, _default: request.args.get(_name, [_default])[0]
+        try:
+            _window = _arg('window', '1h')
+            _k = min(int(_arg('k', 10)), 100)
+            if _k < 1:
+                raise ValueError('k must be at least 1')
+            _tgid = int(_arg('tg', None)) if 'tg' in request.args else None
+            _dims = [_arg('by', None)] if 'by' in request.args else ['sub', 'tg', 'peer']
+            _metrics = [_arg('metric', None)] if 'metric' in request.args else list(TOP_METRICS)
+            if _window not in WINDOWS or not set(_dims) <= set(TOP_ALIASES) or not set(_metrics) <= set(TOP_METRICS):
+                raise ValueError('unknown window, by or metric')
+        except ValueError as e:
+            request.setResponseCode(400)
+            return json_response(request, {'error': str(e)})
+
+        _top = {'window': _window}
+        for _dim in _dims:
+            _top[_dim] = {}
+            for _metric in _metrics:
+                # airtime is in seconds, calls are whole numbers
+                _value = (lambda _n: round(_n, 1)) if _metric == 'airtime' else int
+                _top[_dim][_metric] = [(_id, _value(_count), _value(_error), TOP_ALIASES[_dim](_id)) for _id, _count, _error in leaders.top(_dim, _metric, _window, _k, _tgid if _dim == 'sub' else None)]
+        return json_response(request, _top)
+
+# /stalls   the worst recent reactor stalls with the stack they were caught in
+class stalls_page(Resource):
+    isLeaf = True
+
+    def render_GET(self, request):
+        if not authorized(request):
+            return UNAUTHORIZED
+        return json_response(request, stalls.summary())
+
+# /metrics in the Prometheus text format
+class metrics_page(Resource):
+    isLeaf = True
+
+    def render_GET(self, request):
+        if not authorized(request):
+            return UNAUTHORIZED
+        request.setHeader('Content-Type', METRICS_CONTENT_TYPE)
+        return metrics.render()
+
+# /traffic                           every series with its last 24h totals
+# /traffic?series=tg:3100&res=minute airtime, calls and subscribers per bucket
+#   series are tg:<tgid>, peer:<peer> and ts:<peer>:<slot>, res minute or hour
+class traffic_page(Resource):
+    isLeaf = True
+
+    def render_GET(self, request):
+        if not authorized(request):
+            return UNAUTHORIZED
+        if 'series' not in request.args:
+            return json_response(request, traffic.summary())
+        _series = traffic.get(request.args['series'][0], request.args.get('res', ['minute'])[0])
+        if _series is None:
+            request.setResponseCode(404)
+            return json_response(request, {'error': 'no such series or resolution'})
+        return json_response(request, _series)
 
 # ID ALIAS CREATION
 # Download
@@ -608,6 +1430,10 @@ def mk_aliases(_config):
         result = try_download(_config['ALIASES']['PATH'], _config['ALIASES']['SUBSCRIBER_FILE'], _config['ALIASES']['SUBSCRIBER_URL'], _config['ALIASES']['STALE_TIME'])
         logger.info('[ALIAS]  %s', result)
 
+    # Compact memory mapped indexes instead of the big dictionaries
+    if _config['ALIASES']['INDEX'] == True:
+        return mk_alias_indexes(_config)
+
     # Make Dictionaries
     peer_ids = mk_full_id_dict(_config['ALIASES']['PATH'], _config['ALIASES']['PEER_FILE'],'peer')
     if peer_ids:
@@ -633,6 +1459,61 @@ def mk_aliases(_config):
 
     return peer_ids, subscriber_ids, talkgroup_ids
 
+# Downloading and parsing the alias files can take minutes, it runs in a
+# worker thread and the finished dictionaries are swapped in on the reactor.
+# Used at startup, by the periodic refresh and on SIGHUP.
+alias_load = None
+def load_aliases(_config):
+    global alias_load
+    if alias_load is not None:
+        logger.info('[ALIAS] alias load already running, not starting another')
+        return alias_load
+    logger.info('[ALIAS] loading aliases in the background')
+    alias_load = threads.deferToThread(mk_aliases, _config)
+    alias_load.addCallbacks(aliases_loaded, aliases_failed)
+    alias_load.addBoth(alias_load_done)
+    return alias_load
+
+def alias_load_done(_result):
+    global alias_load
+    alias_load = None
+
+def aliases_loaded(_aliases):
+    global peer_ids, subscriber_ids, talkgroup_ids
+    peer_ids, subscriber_ids, talkgroup_ids = _aliases
+    stalls.stage = 'ALIASES applying'
+    alias_cache.invalidate()
+    realias_tables()
+    stalls.stage = None
+    logger.info('[ALIAS] aliases are now in use')
+
+def aliases_failed(_failure):
+    logger.error('[ALIAS] loading aliases failed, keeping the current ones: %s', _failure.getErrorMessage())
+
+# Rows added before the aliases were ready only show raw IDs
+def realias_tables():
+    for _ipsc_data in CTABLE.itervalues():
+        for _peer_data in _ipsc_data['PEERS'].itervalues():
+            _peer_data.ALIAS = shared(alias_string(_peer_data.RADIO_ID, peer_ids))
+    if CTABLE:
+        scheduler.mark('CTABLE')
+
+def mk_alias_indexes(_config):
+    _path = _config['ALIASES']['PATH']
+
+    peer_ids, rebuilt = load_index(_path, _config['ALIASES']['PEER_FILE'] + '.idx', [(_config['ALIASES']['PEER_FILE'], 'peer'), (_config['ALIASES']['LOCAL_PEER_FILE'], 'peer')])
+    logger.info('[ALIAS] ID ALIAS MAPPER: peer_ids index %s with %s entries', 'rebuilt' if rebuilt else 'is current', len(peer_ids))
+
+    subscriber_ids, rebuilt = load_index(_path, _config['ALIASES']['SUBSCRIBER_FILE'] + '.idx', [(_config['ALIASES']['SUBSCRIBER_FILE'], 'subscriber'), (_config['ALIASES']['LOCAL_SUB_FILE'], 'subscriber')])
+    logger.info('[ALIAS] ID ALIAS MAPPER: subscriber_ids index %s with %s entries', 'rebuilt' if rebuilt else 'is current', len(subscriber_ids))
+
+    # Talkgroups are a short local list, a dictionary is fine
+    talkgroup_ids = mk_full_id_dict(_path, _config['ALIASES']['TGID_FILE'],'tgid')
+    if talkgroup_ids:
+        logger.info('[ALIAS] ID ALIAS MAPPER: talkgroup_ids dictionary is available')
+
+    return peer_ids, subscriber_ids, talkgroup_ids
+
 if __name__ == '__main__':
     import argparse
     #import system
@@ -646,6 +1527,8 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('-c', '--config', action='store', dest='CONFIG_FILE', help='/full/path/to/config.file (usually dmrmonitor.cfg)')
     parser.add_argument('-l', '--logging', action='store', dest='LOG_LEVEL', help='Override config file logging level.')
+    parser.add_argument('-r', '--replay', action='store', dest='REPLAY', help='Replay a capture instead of connecting to DMRlink.')
+    parser.add_argument('-s', '--speed', action='store', dest='SPEED', type=float, default=1.0, help='Replay speed, 0 for as fast as possible and exit when done.')
     cli_args = parser.parse_args()
 
     # Ensure we have a path for the config file, if one wasn't specified, then use the execution directory
@@ -671,6 +1554,9 @@ if __name__ == '__main__':
     WEBAUTH = CONFIG['WEBSITE']['WEB_AUTH']
     WEBUSER = CONFIG['WEBSITE']['WEB_USER']
     WEBPASS = CONFIG['WEBSITE']['WEB_PASS']
+    CLIENT_QUEUE = CONFIG['WEBSITE']['CLIENT_QUEUE']
+    LOGBUF = log_ring(CONFIG['WEBSITE']['LOG_BUFFER'])
+    SLOW_CLIENT = CONFIG['WEBSITE']['SLOW_CLIENT']
 
     # Set up the signal handler
     def sig_handler(_signal, _frame):
@@ -683,18 +1569,54 @@ if __name__ == '__main__':
     for sig in [signal.SIGTERM, signal.SIGINT]:
         signal.signal(sig, sig_handler)
 
-    peer_ids, subscriber_ids, talkgroup_ids = mk_aliases(CONFIG)
+    # SIGHUP reloads the aliases without a restart. CONFIG gets replaced by
+    # DMRlink's config on CONFIG_SND, so hang on to ours for the reloads.
+    ALIAS_CONFIG = CONFIG
+    def hup_handler(_signal, _frame):
+        logger.info('(GLOBAL) SIGHUP received, reloading aliases')
+        reactor.callFromThread(load_aliases, ALIAS_CONFIG)
+    signal.signal(signal.SIGHUP, hup_handler)
+
+    # Airtime, calls and subscribers over time, from the completed calls
+    traffic = traffic_stats(CONFIG['GLOBAL']['TRAFFIC_SERIES'])
+    leaders = leaderboard(CONFIG['GLOBAL']['TOP_CAPACITY'])
+
+    # Pair up bridge START/END events, expiring calls that never end
+    tracker = call_tracker(CONFIG['GLOBAL']['CALL_TIMEOUT'], call_completed)
+    call_expiry = task.LoopingCall(expire_calls)
+    call_expiry.start(tracker.resolution, now=False)
+
+    # Call history database, written in batches from its own thread
+    if CONFIG['HISTORY']['ENABLED']:
+        HISTORY_LIMIT = CONFIG['HISTORY']['QUERY_LIMIT']
+        history = call_history(CONFIG['HISTORY']['FILE'], CONFIG['HISTORY']['COMMIT_SECONDS'])
+        history.start()
+        metrics.collect('dmrmonitor_history_rows_total', 'Rows written to the call history', 'counter', lambda: history.stats['ROWS'])
+
+    # Raw IDs are shown until the aliases have loaded in the background
+    alias_cache = alias_resolver(CONFIG['ALIASES']['CACHE_SIZE'])
+    peer_ids, subscriber_ids, talkgroup_ids = {}, {}, {}
+    reactor.callWhenRunning(load_aliases, ALIAS_CONFIG)
+    if CONFIG['ALIASES']['RELOAD_HOURS'] > 0:
+        alias_reload = task.LoopingCall(load_aliases, ALIAS_CONFIG)
+        alias_reload.start(CONFIG['ALIASES']['RELOAD_HOURS'] * 3600, now=False)
 
     logger.info('(GLOBAL) DMRmonitor \'dmrmonitor.py\' -- SYSTEM STARTING...')
 
-    # Jinja2 Stuff
+    # Jinja2 Stuff, compiled templates are kept between runs
     env = Environment(
         loader=PackageLoader('dmrmonitor', 'templates'),
-        autoescape=select_autoescape(['html', 'xml'])
+        autoescape=select_autoescape(['html', 'xml']),
+        bytecode_cache=FileSystemBytecodeCache(CONFIG['WEBSITE']['TEMPLATE_CACHE'] or None)
     )
 
+    env.filters['h'] = h
+
     dtemplate = env.get_template('dmrlink_table.html')
     btemplate = env.get_template('bridge_table.html')
+    itemplate = env.get_template('dmrlink_ipsc.html')
+    ptemplate = env.get_template('dmrlink_peer.html')
+    gtemplate = env.get_template('bridge_group.html')
 
     # Create Static Website index file
     index_html = get_template(CONFIG['WEBSITE']['PATH'] + 'index_template.html')
@@ -706,24 +1628,66 @@ if __name__ == '__main__':
     else:
         index_html = index_html.replace('<<<timeout_warning>>>', '')
 
-    # Connect to DMRlink
-    reactor.connectTCP(CONFIG['GLOBAL']['DMRLINK_IP'], CONFIG['GLOBAL']['DMRLINK_PORT'], reportClientFactory())
+    # Connect to DMRlink, or play back what it sent another time
+    if cli_args.REPLAY:
+        def replay_done(_stats):
+            print(json.dumps(_stats))
+            if not cli_args.SPEED:
+                reactor.stop()
+        replay = capture_replay(cli_args.REPLAY, cli_args.SPEED, dmrlink_message, replay_done, lambda: decoder.decoding)
+        reactor.callWhenRunning(replay.start)
+    else:
+        if CONFIG['GLOBAL']['CAPTURE_FILE']:
+            capture = capture_writer(CONFIG['GLOBAL']['CAPTURE_FILE'])
+        # Oversize payloads are read and turned away by the decoder, only
+        # something far past MAX_PAYLOAD costs us the connection
+        report.MAX_LENGTH = 2 * CONFIG['GLOBAL']['MAX_PAYLOAD']
+        reactor.connectTCP(CONFIG['GLOBAL']['DMRLINK_IP'], CONFIG['GLOBAL']['DMRLINK_PORT'], reportClientFactory())
 
     # Create websocket server to push content to clients
     dashboard_server = dashboardFactory('ws://*'+WEBSERVICE_STR)
     dashboard_server.protocol = dashboard
+    snapshots = snapshot_cache()
+    fragments = fragment_cache()
+
+    # CONFIG_SND/BRIDGE_SND are decoded off the reactor thread
+    decoder = payload_decoder(CONFIG['GLOBAL']['MAX_PAYLOAD'])
     reactor.listenTCP(CONFIG['WEBSITE']['WEBSERVICE_PORT'], dashboard_server)
 
+    # Coalesce table changes into rate limited renders
+    scheduler = render_scheduler(CONFIG['GLOBAL']['RENDER_WINDOW'], CONFIG['GLOBAL']['RENDER_RATE'])
+
+    # Catch and log whatever blocks the reactor for too long
+    if CONFIG['GLOBAL']['STALL_THRESHOLD'] > 0:
+        stalls.threshold = CONFIG['GLOBAL']['STALL_THRESHOLD']
+        stalls.start()
+
+    # Measure how late the reactor gets to its timers
+    lag = lag_probe(1.0)
+    lag_check = task.LoopingCall(lag.tick)
+    lag_check.start(lag.interval)
+
     # Start update loop
     update_stats = task.LoopingCall(build_stats)
     update_stats.start(CONFIG['GLOBAL']['FREQUENCY'])
+    # Periodic full CONFIG/BRIDGE checkpoints on top of the incremental updates
+    if CONFIG['GLOBAL']['CHECKPOINT'] > 0:
+        checkpoint = task.LoopingCall(request_checkpoint)
+        checkpoint.start(CONFIG['GLOBAL']['CHECKPOINT'], now=False)
     # Start a timout loop
     if CONFIG['WEBSITE']['CLIENT_TIMEOUT'] > 0:
         timeout = task.LoopingCall(timeout_clients)
         timeout.start(10)
 
     # Create static web server to push initial index.html
-    website = Site(web_server())
+    root = web_server()
+    if history is not None:
+        root.putChild('history', history_page())
+    root.putChild('traffic', traffic_page())
+    root.putChild('top', top_page())
+    root.putChild('metrics', metrics_page())
+    root.putChild('stalls', stalls_page())
+    website = Site(root)
     reactor.listenTCP(CONFIG['WEBSITE']['WEB_SERVER_PORT'], website)
 
     reactor.run()
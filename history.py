@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+#
+###############################################################################
+#   Copyright (C) 2020 VK2PSF
+#   Copyright (C) 2016-2018 Cortney T. Buffington, N0MJS <n0mjs@me.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+###############################################################################
+
+'''
+Call history for dmrmonitor.py. Bridged calls and RCM call status changes are
+kept as rows in an append-only SQLite database so they can be searched by
+talkgroup, subscriber, peer and time long after they've scrolled out of the
+dashboard's event log.
+
+SQLite is only ever touched from one worker thread: rows are collected on the
+reactor and handed over in batches, one transaction per batch, and queries
+queue up on the same thread and come back as Deferreds.
+'''
+
+import sqlite3
+from time import time
+
+from twisted.internet import reactor, threads
+from twisted.python.threadpool import ThreadPool
+
+# Does anybody read this stuff? There's a PEP somewhere that says I should do this.
+__author__     = 'Alex Stewart, VK2PSF'
+__copyright__  = 'Copyright (c) 2016-2019,2020 VK2PSF ,Cortney T. Buffington, N0MJS and the K0USY Group'
+__credits__    = 'Colin Durbridge, G4EML, Steve Zingman, N4IRS; Mike Zingman, N4IRR; Jonathan Naylor, G4KLX; Hans Barthen, DL5DI; Torsten Shultze, DG1HT'
+__license__    = 'GNU GPLv3'
+__maintainer__ = 'Alex Stewart , N0MJS'
+__email__      = 'vk2psf@arrl.net'
+
+
+# Two kinds of row, told apart by SOURCE:
+#   'CALL'  one per bridged call once the call tracker closes it, TIME is when
+#           it started and EVENT how it closed (COMPLETE, ORPHAN, ...). PEER is
+#           where the call came from.
+#   'RCM'   each call status change (Active, End, ...) a repeater reports as
+#           EVENT. PEER is the reporting repeater, SRC_PEER where the call
+#           came from.
+FIELDS = ('TIME', 'SOURCE', 'EVENT', 'IPSC', 'PEER', 'SRC_PEER', 'SUB', 'TS', 'TGID', 'TYPE', 'DURATION')
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS calls ('
+    'time REAL NOT NULL, source TEXT NOT NULL, event TEXT NOT NULL, ipsc TEXT, '
+    'peer INTEGER, src_peer INTEGER, sub INTEGER, ts INTEGER, tgid INTEGER, '
+    'type TEXT, duration REAL)',
+    'CREATE INDEX IF NOT EXISTS calls_time ON calls (time)',
+    'CREATE INDEX IF NOT EXISTS calls_tgid ON calls (tgid, time)',
+    'CREATE INDEX IF NOT EXISTS calls_sub ON calls (sub, time)',
+    'CREATE INDEX IF NOT EXISTS calls_peer ON calls (peer, time)'
+)
+
+INSERT = 'INSERT INTO calls VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+
+# Query arguments and the column each one filters on
+FILTERS = (('source', 'source = ?'), ('tgid', 'tgid = ?'), ('sub', 'sub = ?'), ('peer', 'peer = ?'), ('since', 'time >= ?'), ('until', 'time < ?'))
+
+
+class call_history(object):
+    def __init__(self, _file, _commit_seconds=1.0):
+        self.file = _file
+        self.commit_seconds = _commit_seconds
+        self.rows = []
+        self.pending = None
+        self.conn = None
+        self.stats = {'ROWS': 0, 'COMMITS': 0, 'SECONDS': 0.0, 'ERRORS': 0}
+        # A single thread owns the connection, so writes never contend
+        self.pool = ThreadPool(1, 1, 'history')
+
+    def start(self):
+        self.pool.start()
+        self.pool.callInThread(self.open)
+        reactor.addSystemEventTrigger('during', 'shutdown', self.stop)
+
+    # Commits whatever is still pending, then waits for the thread to finish
+    def stop(self):
+        self.flush()
+        self.pool.callInThread(self.close)
+        self.pool.stop()
+
+    def open(self):
+        self.conn = sqlite3.connect(self.file)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        for _statement in SCHEMA:
+            self.conn.execute(_statement)
+        self.conn.commit()
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    # Called on the reactor for every event, rows are written every commit_seconds
+    def record(self, _source, _event, _ipsc, _peer, _sub, _ts, _tgid, _src_peer=None, _type=None, _duration=None, _time=None):
+        self.rows.append((_time or time(), _source, _event, _ipsc, _peer, _src_peer, _sub, _ts, _tgid, _type, _duration))
+        if self.pending is None:
+            self.pending = reactor.callLater(self.commit_seconds, self.flush)
+
+    def flush(self):
+        if self.pending is not None and self.pending.active():
+            self.pending.cancel()
+        self.pending = None
+        if self.rows:
+            _rows, self.rows = self.rows, []
+            self.pool.callInThread(self.write, _rows)
+
+    def write(self, _rows):
+        _start = time()
+        try:
+            with self.conn:
+                self.conn.executemany(INSERT, _rows)
+        except sqlite3.Error:
+            self.stats['ERRORS'] += 1
+            raise
+        self.stats['ROWS'] += len(_rows)
+        self.stats['COMMITS'] += 1
+        self.stats['SECONDS'] += time() - _start
+
+    # Returns a Deferred that fires with a list of dictionaries keyed by FIELDS,
+    # newest first. Rows still waiting for their batch commit are not included.
+    def query(self, source=None, tgid=None, sub=None, peer=None, since=None, until=None, limit=100):
+        _args = {'source': source, 'tgid': tgid, 'sub': sub, 'peer': peer, 'since': since, 'until': until}
+        _where = []
+        _values = []
+        for _arg, _clause in FILTERS:
+            if _args[_arg] is not None:
+                _where.append(_clause)
+                _values.append(_args[_arg])
+        _sql = 'SELECT * FROM calls'
+        if _where:
+            _sql += ' WHERE ' + ' AND '.join(_where)
+        _sql += ' ORDER BY time DESC LIMIT ?'
+        _values.append(limit)
+        return threads.deferToThreadPool(reactor, self.pool, self.select, _sql, _values)
+
+    def select(self, _sql, _values):
+        return [dict(zip(FIELDS, _row)) for _row in self.conn.execute(_sql, _values)]
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+#
+###############################################################################
+#   Copyright (C) 2020 VK2PSF
+#   Copyright (C) 2016-2018 Cortney T. Buffington, N0MJS <n0mjs@me.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+###############################################################################
+
+'''
+Top talkers for dmrmonitor.py: the subscribers, talkgroups and peers with the
+most airtime or the most calls over the last 5 minutes, hour and day.
+
+Every ranking is a Space-Saving summary: it only ever holds a fixed number of
+IDs, and a new ID pushes out the smallest one, inheriting its count as an
+upper bound on the error. Heavy hitters can't be pushed out, so the top of
+the list is right no matter how many different subscribers go past, and the
+memory used doesn't depend on it.
+
+Each window is made of SLICES summaries covering consecutive slices of it,
+the oldest dropped as time moves on, so the window slides in steps of
+1/SLICES of its length. A query merges those summaries, the cost depends on
+the summary size and not on the number of IDs heard.
+'''
+
+from heapq import heappush, heappop, heapreplace, nlargest
+from collections import deque
+from operator import itemgetter
+from time import time
+
+# Does anybody read this stuff? There's a PEP somewhere that says I should do this.
+__author__     = 'Alex Stewart, VK2PSF'
+__copyright__  = 'Copyright (c) 2016-2019,2020 VK2PSF ,Cortney T. Buffington, N0MJS and the K0USY Group'
+__credits__    = 'Colin Durbridge, G4EML, Steve Zingman, N4IRS; Mike Zingman, N4IRR; Jonathan Naylor, G4KLX; Hans Barthen, DL5DI; Torsten Shultze, DG1HT'
+__license__    = 'GNU GPLv3'
+__maintainer__ = 'Alex Stewart , N0MJS'
+__email__      = 'vk2psf@arrl.net'
+
+
+WINDOWS    = {'5m': 300, '1h': 3600, '24h': 86400}
+SLICES     = 12
+METRICS    = ('airtime', 'calls')
+# 'tgsub' ranks (tgid, subscriber) pairs, for who is busiest on one talkgroup
+DIMENSIONS = ('sub', 'tg', 'peer', 'tgsub')
+# The pairs are spread over every talkgroup, so they get a bigger summary
+PAIR_FACTOR = 4
+
+
+class space_saving(object):
+    def __init__(self, _capacity):
+        self.capacity = _capacity
+        self.counts = {}
+        self.errors = {}
+        # (count, id) with counts that may be behind, fixed up when they surface
+        self.heap = []
+
+    def __len__(self):
+        return len(self.counts)
+
+    def add(self, _id, _weight):
+        if _id in self.counts:
+            self.counts[_id] += _weight
+            return
+        _floor = 0
+        if len(self.counts) >= self.capacity:
+            while self.heap[0][0] != self.counts[self.heap[0][1]]:
+                heapreplace(self.heap, (self.counts[self.heap[0][1]], self.heap[0][1]))
+            _floor, _evicted = heappop(self.heap)
+            del self.counts[_evicted]
+            del self.errors[_evicted]
+        self.counts[_id] = _floor + _weight
+        self.errors[_id] = _floor
+        heappush(self.heap, (self.counts[_id], _id))
+
+
+class sliding_top(object):
+    def __init__(self, _width, _capacity):
+        self.slice_width = float(_width) / SLICES
+        self.capacity = _capacity
+        self.slices = deque(maxlen=SLICES)
+
+    def summaries(self, _now):
+        _slice = int(_now // self.slice_width)
+        if not self.slices or self.slices[-1][0] != _slice:
+            self.slices.append((_slice, dict(((_dim, _metric), space_saving(self.capacity * (PAIR_FACTOR if _dim == 'tgsub' else 1))) for _dim in DIMENSIONS for _metric in METRICS)))
+        return self.slices[-1][1]
+
+    def add(self, _ids, _airtime, _now):
+        _summaries = self.summaries(_now)
+        for _dim, _id in _ids.iteritems():
+            _summaries[(_dim, 'airtime')].add(_id, _airtime)
+            _summaries[(_dim, 'calls')].add(_id, 1)
+
+    # [(id, count, error), ...] biggest first. _match filters the ids first.
+    def top(self, _dim, _metric, _k, _now, _match=None):
+        _oldest = int(_now // self.slice_width) - SLICES + 1
+        _counts = {}
+        _errors = {}
+        for _slice, _summaries in self.slices:
+            if _slice < _oldest:
+                continue
+            _summary = _summaries[(_dim, _metric)]
+            for _id, _count in _summary.counts.iteritems():
+                if _match is None or _match(_id):
+                    _counts[_id] = _counts.get(_id, 0) + _count
+                    _errors[_id] = _errors.get(_id, 0) + _summary.errors[_id]
+        return [(_id, _count, _errors[_id]) for _id, _count in nlargest(_k, _counts.iteritems(), key=itemgetter(1))]
+
+
+class leaderboard(object):
+    def __init__(self, _capacity):
+        self.windows = dict((_name, sliding_top(_width, _capacity)) for _name, _width in WINDOWS.iteritems())
+
+    # _call is a completed call record from the call tracker
+    def add(self, _call, _now=None):
+        _airtime = _call['DURATION'] or _call['REPORTED'] or 0
+        _ids = {'sub': _call['SUB'], 'tg': _call['TGID'], 'peer': _call['PEER'], 'tgsub': (_call['TGID'], _call['SUB'])}
+        for _window in self.windows.itervalues():
+            _window.add(_ids, _airtime, _now or time())
+
+    def top(self, _dim, _metric, _window, _k=10, _tgid=None, _now=None):
+        if _tgid is not None:
+            _dim, _match = 'tgsub', lambda _id: _id[0] == _tgid
+        else:
+            _match = None
+        _top = self.windows[_window].top(_dim, _metric, _k, _now or time(), _match)
+        if _tgid is not None:
+            _top = [(_id[1], _count, _error) for _id, _count, _error in _top]
+        return _top
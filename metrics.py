@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+#
+###############################################################################
+#   Copyright (C) 2020 VK2PSF
+#   Copyright (C) 2016-2018 Cortney T. Buffington, N0MJS <n0mjs@me.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+###############################################################################
+
+'''
+Internal counters for dmrmonitor.py, served in the Prometheus text format.
+
+Counters and histograms are plain dictionaries updated in place, so they cost
+a dictionary lookup and an add where they're counted. Numbers that something
+else already keeps (broadcast totals, cache hits, ...) are read through a
+callback when the metrics are scraped rather than being counted twice.
+'''
+
+import logging
+from bisect import bisect_left
+
+# Does anybody read this stuff? There's a PEP somewhere that says I should do this.
+__author__     = 'Alex Stewart, VK2PSF'
+__copyright__  = 'Copyright (c) 2016-2019,2020 VK2PSF ,Cortney T. Buffington, N0MJS and the K0USY Group'
+__credits__    = 'Colin Durbridge, G4EML, Steve Zingman, N4IRS; Mike Zingman, N4IRR; Jonathan Naylor, G4KLX; Hans Barthen, DL5DI; Torsten Shultze, DG1HT'
+__license__    = 'GNU GPLv3'
+__maintainer__ = 'Alex Stewart , N0MJS'
+__email__      = 'vk2psf@arrl.net'
+
+logger = logging.getLogger(__name__)
+
+
+# Histogram buckets in seconds, from a fraction of a millisecond to seconds
+SECONDS_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def format_labels(_names, _values):
+    if not _names:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(_name, str(_value).replace('\\', '\\\\').replace('"', '\\"')) for _name, _value in zip(_names, _values)) + '}'
+
+def format_value(_value):
+    return repr(float(_value)) if isinstance(_value, float) else str(_value)
+
+
+class counter(object):
+    type = 'counter'
+
+    def __init__(self, _name, _help, _labels=()):
+        self.name = _name
+        self.help = _help
+        self.labels = _labels
+        self.values = {}
+
+    def inc(self, _labels=(), _amount=1):
+        self.values[_labels] = self.values.get(_labels, 0) + _amount
+
+    def samples(self):
+        return [(self.name, format_labels(self.labels, _values), _value) for _values, _value in sorted(self.values.iteritems())]
+
+
+class histogram(object):
+    type = 'histogram'
+
+    def __init__(self, _name, _help, _labels=(), _buckets=SECONDS_BUCKETS):
+        self.name = _name
+        self.help = _help
+        self.labels = _labels
+        self.buckets = _buckets
+        # per label set: [count in each bucket (last is +Inf), sum]
+        self.values = {}
+
+    def observe(self, _value, _labels=()):
+        _entry = self.values.get(_labels)
+        if _entry is None:
+            _entry = self.values[_labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        _entry[0][bisect_left(self.buckets, _value)] += 1
+        _entry[1] += _value
+
+    def samples(self):
+        _samples = []
+        _names = self.labels + ('le',)
+        for _values, (_counts, _sum) in sorted(self.values.iteritems()):
+            _total = 0
+            for _bound, _count in zip(self.buckets + ('+Inf',), _counts):
+                _total += _count
+                _samples.append((self.name + '_bucket', format_labels(_names, _values + (_bound,)), _total))
+            _samples.append((self.name + '_sum', format_labels(self.labels, _values), _sum))
+            _samples.append((self.name + '_count', format_labels(self.labels, _values), _total))
+        return _samples
+
+
+# Read when scraped: _callback returns a number, or {label values: number}
+class collected(object):
+    def __init__(self, _name, _help, _type, _callback, _labels=()):
+        self.name = _name
+        self.help = _help
+        self.type = _type
+        self.labels = _labels
+        self.callback = _callback
+
+    def samples(self):
+        _value = self.callback()
+        if not isinstance(_value, dict):
+            return [(self.name, '', _value)]
+        return [(self.name, format_labels(self.labels, _values), _v) for _values, _v in sorted(_value.iteritems())]
+
+
+class metric_registry(object):
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, _metric):
+        self.metrics.append(_metric)
+        return _metric
+
+    def counter(self, _name, _help, _labels=()):
+        return self.add(counter(_name, _help, _labels))
+
+    def histogram(self, _name, _help, _labels=(), _buckets=SECONDS_BUCKETS):
+        return self.add(histogram(_name, _help, _labels, _buckets))
+
+    def collect(self, _name, _help, _type, _callback, _labels=()):
+        return self.add(collected(_name, _help, _type, _callback, _labels))
+
+    def render(self):
+        _lines = []
+        for _metric in self.metrics:
+            try:
+                _samples = _metric.samples()
+            except Exception as e:
+                # one broken collector shouldn't cost the scrape everything else
+                logger.error('(METRICS) collecting %s failed: %s', _metric.name, e)
+                continue
+            _lines.append('# HELP {} {}'.format(_metric.name, _metric.help))
+            _lines.append('# TYPE {} {}'.format(_metric.name, _metric.type))
+            for _name, _labels, _value in _samples:
+                _lines.append('{}{} {}'.format(_name, _labels, format_value(_value)))
+        return '\n'.join(_lines) + '\n'
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+#
+###############################################################################
+#   Copyright (C) 2020 VK2PSF
+#   Copyright (C) 2016-2018 Cortney T. Buffington, N0MJS <n0mjs@me.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+###############################################################################
+
+'''
+Decoding of the RCM (repeater call monitor) packets DMRlink forwards as
+RCM_SND: "IPSC name,packet". Each packet type is unpacked with one
+precompiled struct into a small record, and anything too short, of a type
+we don't know or with a field outside what we can show is refused with an
+rcm_error rather than blowing up further on.
+
+status_array() decodes the CALL_MON_STATUS packets of a whole capture at
+once into numpy arrays, for looking at a busy net after the fact.
+'''
+
+import struct
+from collections import namedtuple
+
+from ipsc_const import CALL_MON_STATUS, CALL_MON_RPT, CALL_MON_NACK, STATUS, TYPE
+
+# numpy is only needed for status_array()
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Does anybody read this stuff? There's a PEP somewhere that says I should do this.
+__author__     = 'Alex Stewart, VK2PSF'
+__copyright__  = 'Copyright (c) 2016-2019,2020 VK2PSF ,Cortney T. Buffington, N0MJS and the K0USY Group'
+__credits__    = 'Colin Durbridge, G4EML, Steve Zingman, N4IRS; Mike Zingman, N4IRR; Jonathan Naylor, G4KLX; Hans Barthen, DL5DI; Torsten Shultze, DG1HT'
+__license__    = 'GNU GPLv3'
+__maintainer__ = 'Alex Stewart , N0MJS'
+__email__      = 'vk2psf@arrl.net'
+
+
+RCM_NAMES = {CALL_MON_STATUS: 'STATUS', CALL_MON_RPT: 'RPT', CALL_MON_NACK: 'NACK'}
+
+# type, source peer, source peer again (the one the call came from), sequence
+# number, timeslot, ?, status, subscriber and destination as 1+2 bytes,
+# call type. Priority and security follow but aren't used.
+STATUS_PACKET = struct.Struct('>c4sI4xBxcBHBHc')
+# type, source peer, timeslot 1 state, timeslot 2 state
+RPT_PACKET    = struct.Struct('>c4scc')
+# type, source peer, NACK code
+NACK_PACKET   = struct.Struct('>c4sc')
+
+rcm_status = namedtuple('rcm_status', 'SOURCE SRC_PEER TS STATUS SRC_SUB DEST TYPE')
+rcm_rpt    = namedtuple('rcm_rpt', 'SOURCE STATES')
+rcm_nack   = namedtuple('rcm_nack', 'SOURCE NACK')
+
+
+class rcm_error(ValueError):
+    def __init__(self, _reason, _detail):
+        ValueError.__init__(self, '{}: {}'.format(_reason, _detail))
+        self.reason = _reason
+
+
+def decode_status(_packet):
+    _type, _source, _src_peer, _ts, _status, _sub_hi, _sub_lo, _dest_hi, _dest_lo, _call_type = STATUS_PACKET.unpack_from(_packet)
+    if _ts > 1:
+        raise rcm_error('BAD_FIELD', 'timeslot {}'.format(_ts + 1))
+    if _status not in STATUS or _call_type not in TYPE:
+        raise rcm_error('BAD_FIELD', 'status {!r} call type {!r}'.format(_status, _call_type))
+    return rcm_status(_source, _src_peer, _ts + 1, STATUS[_status], _sub_hi << 16 | _sub_lo, _dest_hi << 16 | _dest_lo, TYPE[_call_type])
+
+def decode_rpt(_packet):
+    _type, _source, _ts1, _ts2 = RPT_PACKET.unpack_from(_packet)
+    return rcm_rpt(_source, (_ts1, _ts2))
+
+def decode_nack(_packet):
+    _type, _source, _nack = NACK_PACKET.unpack_from(_packet)
+    return rcm_nack(_source, _nack)
+
+DECODERS = {
+    CALL_MON_STATUS: (STATUS_PACKET.size, decode_status),
+    CALL_MON_RPT:    (RPT_PACKET.size, decode_rpt),
+    CALL_MON_NACK:   (NACK_PACKET.size, decode_nack)
+}
+
+# An RCM_SND payload to (IPSC name, packet type, record)
+def decode_rcm(_data):
+    _name, _comma, _packet = _data.partition(',')
+    if not _comma or not _packet:
+        raise rcm_error('SHORT', 'no packet after the IPSC name')
+    _type = _packet[0]
+    if _type not in DECODERS:
+        raise rcm_error('UNKNOWN', 'packet type {!r}'.format(_type))
+    _size, _decode = DECODERS[_type]
+    if len(_packet) < _size:
+        raise rcm_error('SHORT', '{} bytes of {} for {}'.format(len(_packet), _size, RCM_NAMES[_type]))
+    return _name, _type, _decode(_packet)
+
+
+#
+# BATCH DECODING
+#
+# The same layout as STATUS_PACKET, the 3 byte IDs still in two parts
+STATUS_DTYPE = [
+    ('TYPE_BYTE', 'S1'), ('SOURCE', '>u4'), ('SRC_PEER', '>u4'), ('SEQ', '>u4'), ('TS', 'u1'), ('PAD', 'u1'),
+    ('STATUS', 'S1'), ('SUB_HI', 'u1'), ('SUB_LO', '>u2'), ('DEST_HI', 'u1'), ('DEST_LO', '>u2'), ('TYPE', 'S1')
+]
+RCM_SND = '\x08'
+
+# Every well formed CALL_MON_STATUS in the (seconds, message) records that
+# capture.read_capture() gives, as a dictionary of equal length arrays.
+# STATUS and TYPE are left as the raw bytes, ipsc_const has the names.
+def status_array(_records):
+    if numpy is None:
+        raise RuntimeError('numpy is needed for batch RCM decoding')
+    _times, _names, _packets = [], [], []
+    for _seconds, _message in _records:
+        if _message[:1] != RCM_SND:
+            continue
+        _name, _comma, _packet = _message[1:].partition(',')
+        if _packet[:1] != CALL_MON_STATUS or len(_packet) < STATUS_PACKET.size:
+            continue
+        _times.append(_seconds)
+        _names.append(_name)
+        _packets.append(_packet[:STATUS_PACKET.size])
+    _raw = numpy.frombuffer(''.join(_packets), dtype=numpy.dtype(STATUS_DTYPE))
+    return {
+        'TIME': numpy.array(_times),
+        'IPSC': numpy.array(_names),
+        'SOURCE': _raw['SOURCE'].astype(numpy.uint32),
+        'SRC_PEER': _raw['SRC_PEER'].astype(numpy.uint32),
+        'TS': _raw['TS'] + 1,
+        'STATUS': _raw['STATUS'],
+        'SRC_SUB': _raw['SUB_HI'].astype(numpy.uint32) << 16 | _raw['SUB_LO'],
+        'DEST': _raw['DEST_HI'].astype(numpy.uint32) << 16 | _raw['DEST_LO'],
+        'TYPE': _raw['TYPE']
+    }
+
+
+if __name__ == '__main__':
+    import sys
+    from capture import read_capture
+
+    if len(sys.argv) != 2:
+        sys.exit('usage: python rcm.py CAPTURE_FILE')
+    _status = status_array(read_capture(sys.argv[1]))
+    print('{} RCM STATUS packets over {:.1f}s'.format(len(_status['TIME']), _status['TIME'][-1] - _status['TIME'][0] if len(_status['TIME']) else 0))
+    _codes, _counts = numpy.unique(_status['STATUS'], return_counts=True)
+    for _code, _count in zip(_codes, _counts):
+        print('  {:20} {}'.format(STATUS.get(_code, repr(_code)), _count))
+    _active = _status['STATUS'] == '\x01'
+    _dests, _counts = numpy.unique(_status['DEST'][_active], return_counts=True)
+    print('busiest destinations while active:')
+    for _i in numpy.argsort(_counts)[::-1][:10]:
+        print('  {:8} {}'.format(_dests[_i], _counts[_i]))
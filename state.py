@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+#
+###############################################################################
+#   Copyright (C) 2020 VK2PSF
+#   Copyright (C) 2016-2018 Cortney T. Buffington, N0MJS <n0mjs@me.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+###############################################################################
+
+'''
+The objects behind the DMRlink (CTABLE) and conference bridge (BTABLE) tables.
+
+A network with thousands of peers holds one PeerState and two TimeslotStates
+for each, and one BridgeMemberState for every system on every bridge. They
+use __slots__ rather than a dictionary per object, are changed in place when
+DMRlink reports something new instead of being rebuilt, and share one copy
+of the status, colour and other strings that repeat across the table.
+
+The templates and the deltas read the fields as attributes.
+'''
+
+from dmr_utils.utils import int_id
+
+# Does anybody read this stuff? There's a PEP somewhere that says I should do this.
+__author__     = 'Alex Stewart, VK2PSF'
+__copyright__  = 'Copyright (c) 2016-2019,2020 VK2PSF ,Cortney T. Buffington, N0MJS and the K0USY Group'
+__credits__    = 'Colin Durbridge, G4EML, Steve Zingman, N4IRS; Mike Zingman, N4IRR; Jonathan Naylor, G4KLX; Hans Barthen, DL5DI; Torsten Shultze, DG1HT'
+__license__    = 'GNU GPLv3'
+__maintainer__ = 'Alex Stewart , N0MJS'
+__email__      = 'vk2psf@arrl.net'
+
+
+RED    = intern('#ff0000')
+GREEN  = intern('#00ff00')
+BLUE   = intern('#0000ff')
+ORANGE = intern('#ff8000')
+WHITE  = intern('#ffffff')
+
+PEER_STATUS = ('CONNECTED', 'KEEP_ALIVES_SENT', 'KEEP_ALIVES_RECEIVED', 'KEEP_ALIVES_MISSED')
+# What a BRIDGES system entry needs to hold to be shown
+BRIDGE_KEYS = ('SYSTEM', 'TS', 'TGID', 'ACTIVE', 'TO_TYPE', 'TIMER', 'ON', 'OFF')
+
+
+# Aliases and the like come back as a new string every time, keep one copy
+def shared(_value):
+    return intern(_value) if type(_value) is str else _value
+
+
+class TimeslotState(object):
+    __slots__ = ('STATUS', 'TYPE', 'SRC_SUB', 'SRC_PEER', 'DEST', 'COLOR', 'LAST', 'CALL')
+
+    def __init__(self, _now):
+        self.clear(_now)
+        # (status, subscriber, destination) of the last call status seen
+        self.CALL = None
+
+    def active(self, _status, _type, _src_sub, _src_peer, _dest, _now):
+        self.STATUS = _status
+        self.TYPE = _type
+        self.SRC_SUB = shared(_src_sub)
+        self.SRC_PEER = shared(_src_peer)
+        self.DEST = _dest
+        self.COLOR = GREEN
+        self.LAST = _now
+
+    def clear(self, _now):
+        self.STATUS = self.TYPE = self.SRC_SUB = self.SRC_PEER = self.DEST = ''
+        self.COLOR = WHITE
+        self.LAST = _now
+
+
+class PeerState(object):
+    __slots__ = ('TYPE', 'RADIO_ID', 'ALIAS', 'IP', 'CONNECTED', 'KEEP_ALIVES_SENT', 'KEEP_ALIVES_RECEIVED', 'KEEP_ALIVES_MISSED', 'TS1', 'TS2')
+
+    def __init__(self, _type, _peer, _alias, _config_peer_data, _now):
+        self.TYPE = intern(_type)
+        self.RADIO_ID = int_id(_peer)
+        self.ALIAS = shared(_alias)
+        self.IP = shared(_config_peer_data['IP'])
+        for _field in PEER_STATUS:
+            setattr(self, _field, _config_peer_data['STATUS'][_field])
+        self.TS1 = TimeslotState(_now)
+        self.TS2 = TimeslotState(_now)
+
+    # A *_UPD only carries what changed, a peer built from one needs it all
+    @staticmethod
+    def complete(_config_peer_data):
+        return 'IP' in _config_peer_data and all(_field in _config_peer_data.get('STATUS', {}) for _field in PEER_STATUS)
+
+    def timeslot(self, _ts):
+        return self.TS1 if _ts == 1 else self.TS2
+
+    # Returns the fields that actually changed
+    def update(self, _config_peer_data):
+        _changed = []
+        if self.IP != _config_peer_data['IP']:
+            self.IP = shared(_config_peer_data['IP'])
+            _changed.append('IP')
+        _status = _config_peer_data['STATUS']
+        for _field in PEER_STATUS:
+            if getattr(self, _field) != _status[_field]:
+                setattr(self, _field, _status[_field])
+                _changed.append(_field)
+        return _changed
+
+
+# Timers are published as the absolute time they expire, the page counts down
+# by itself so an unchanged bridge never has to be sent again
+class BridgeMemberState(object):
+    __slots__ = ('TS', 'TGID', 'EXPIRES', 'TO_ACTION', 'ACTIVE', 'COLOR', 'TRIG_ON', 'TRIG_OFF')
+
+    def __init__(self, _system):
+        self.ACTIVE = self.COLOR = ''
+        self.load(_system)
+
+    @staticmethod
+    def complete(_system):
+        return all(_key in _system for _key in BRIDGE_KEYS)
+
+    # Takes a BRIDGES system entry with its triggers already converted to
+    # ints, returns True if anything shown for it changed
+    def load(self, _system):
+        if _system['TO_TYPE'] == 'ON':
+            _expires, _action = _system['TIMER'], 'Disconnect'
+        elif _system['TO_TYPE'] == 'OFF':
+            _expires, _action = _system['TIMER'], 'Connect'
+        else:
+            _expires, _action = None, 'None'
+
+        # anything other than True or False leaves it as it was
+        if _system['ACTIVE'] == True:
+            _active, _color = 'Connected', GREEN
+        elif _system['ACTIVE'] == False:
+            _active, _color = 'Disconnected', RED
+        else:
+            _active, _color = self.ACTIVE, self.COLOR
+
+        _new = (_system['TS'], int_id(_system['TGID']), _expires, _action, _active, _color,
+                intern(', '.join([str(_trigger) for _trigger in _system['ON']])),
+                intern(', '.join([str(_trigger) for _trigger in _system['OFF']])))
+        if _new == self.fields():
+            return False
+        self.TS, self.TGID, self.EXPIRES, self.TO_ACTION, self.ACTIVE, self.COLOR, self.TRIG_ON, self.TRIG_OFF = _new
+        return True
+
+    def fields(self):
+        return tuple(getattr(self, _field, None) for _field in self.__slots__)
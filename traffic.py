@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+#
+###############################################################################
+#   Copyright (C) 2020 VK2PSF
+#   Copyright (C) 2016-2018 Cortney T. Buffington, N0MJS <n0mjs@me.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+###############################################################################
+
+'''
+Channel loading for dmrmonitor.py: airtime, number of calls and number of
+different subscribers, per talkgroup, per peer and per peer timeslot, in
+per-minute buckets for the last day and per-hour buckets for the last 30 days.
+
+Each series is a handful of fixed size arrays used as rings, so memory doesn't
+grow with traffic, only with the number of series, and that is capped. Only
+the subscribers of the bucket being filled are kept as a set; older buckets
+just remember how many there were.
+'''
+
+from array import array
+from time import time
+
+# Does anybody read this stuff? There's a PEP somewhere that says I should do this.
+__author__     = 'Alex Stewart, VK2PSF'
+__copyright__  = 'Copyright (c) 2016-2019,2020 VK2PSF ,Cortney T. Buffington, N0MJS and the K0USY Group'
+__credits__    = 'Colin Durbridge, G4EML, Steve Zingman, N4IRS; Mike Zingman, N4IRR; Jonathan Naylor, G4KLX; Hans Barthen, DL5DI; Torsten Shultze, DG1HT'
+__license__    = 'GNU GPLv3'
+__maintainer__ = 'Alex Stewart , N0MJS'
+__email__      = 'vk2psf@arrl.net'
+
+
+# Bucket width in seconds and number of buckets for each resolution
+RESOLUTIONS = {
+    'minute': (60, 1440),
+    'hour':   (3600, 720)
+}
+
+
+class traffic_ring(object):
+    def __init__(self, _step, _size):
+        self.step = _step
+        self.size = _size
+        self.airtime = array('f', [0.0]) * _size
+        self.calls = array('I', [0]) * _size
+        self.subs = array('I', [0]) * _size
+        self.current = None
+        self.seen = set()
+
+    # Move the ring forward to _bucket, clearing the buckets skipped on the way
+    def roll(self, _bucket):
+        if self.current is None:
+            self.current = _bucket
+            return
+        if _bucket <= self.current:
+            return
+        for _old in xrange(max(self.current + 1, _bucket - self.size + 1), _bucket + 1):
+            _index = _old % self.size
+            self.airtime[_index] = 0.0
+            self.calls[_index] = 0
+            self.subs[_index] = 0
+        self.current = _bucket
+        self.seen = set()
+
+    # Airtime is spread over the buckets the call spanned, the call and its
+    # subscriber count where it ended
+    def add(self, _start, _end, _sub):
+        _last = int(_end // self.step)
+        self.roll(_last)
+        _oldest = self.current - self.size + 1
+        if _last < _oldest:
+            return
+        _bucket = max(int(_start // self.step), _oldest)
+        while _bucket <= _last:
+            _from = max(_start, _bucket * self.step)
+            _to = min(_end, (_bucket + 1) * self.step)
+            if _to > _from:
+                self.airtime[_bucket % self.size] += _to - _from
+            _bucket += 1
+        _index = _last % self.size
+        self.calls[_index] += 1
+        # subscribers can only be told apart in the bucket being filled
+        if _last == self.current and _sub not in self.seen:
+            self.seen.add(_sub)
+            self.subs[_index] = len(self.seen)
+
+    # Oldest bucket first, ending with the one that _now falls in
+    def export(self, _now):
+        self.roll(int(_now // self.step))
+        _first = self.current - self.size + 1
+        _order = [_bucket % self.size for _bucket in xrange(_first, self.current + 1)]
+        return {
+            'start': _first * self.step,
+            'step': self.step,
+            'airtime': [round(self.airtime[_i], 1) for _i in _order],
+            'calls': [self.calls[_i] for _i in _order],
+            'subs': [self.subs[_i] for _i in _order]
+        }
+
+
+class traffic_stats(object):
+    def __init__(self, _max_series):
+        self.max_series = _max_series
+        self.series = {}
+        self.stats = {'CALLS': 0, 'DROPPED': 0}
+
+    # Series names as used by the /traffic page
+    def keys_for(self, _call):
+        return ('tg:{}'.format(_call['TGID']), 'peer:{}'.format(_call['PEER']), 'ts:{}:{}'.format(_call['PEER'], _call['TS']))
+
+    # _call is a completed call record from the call tracker
+    def add(self, _call):
+        _end = _call['END']
+        _start = _end - (_call['DURATION'] or _call['REPORTED'] or 0)
+        self.stats['CALLS'] += 1
+        for _key in self.keys_for(_call):
+            _rings = self.series.get(_key)
+            if _rings is None:
+                if len(self.series) >= self.max_series:
+                    self.stats['DROPPED'] += 1
+                    continue
+                _rings = self.series[_key] = dict((_res, traffic_ring(*_shape)) for _res, _shape in RESOLUTIONS.iteritems())
+            for _ring in _rings.itervalues():
+                _ring.add(_start, _end, _call['SUB'])
+
+    def get(self, _key, _resolution, _now=None):
+        if _key not in self.series or _resolution not in RESOLUTIONS:
+            return None
+        _series = self.series[_key][_resolution].export(_now or time())
+        _series['series'] = _key
+        return _series
+
+    # Every series with its airtime and calls over the last day
+    def summary(self, _now=None):
+        _bucket = int((_now or time()) // RESOLUTIONS['minute'][0])
+        _summary = {}
+        for _key, _rings in self.series.iteritems():
+            _day = _rings['minute']
+            _day.roll(_bucket)
+            _summary[_key] = {'airtime': round(sum(_day.airtime), 1), 'calls': sum(_day.calls)}
+        return _summary
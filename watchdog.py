@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+#
+###############################################################################
+#   Copyright (C) 2020 VK2PSF
+#   Copyright (C) 2016-2018 Cortney T. Buffington, N0MJS <n0mjs@me.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+###############################################################################
+
+'''
+Reactor stall detection for dmrmonitor.py. A timer on the reactor updates a
+heartbeat every interval; a separate thread watches it, and when the reactor
+hasn't got round to it for longer than the threshold, grabs the reactor
+thread's Python stack while it is still stuck and logs it together with the
+stage dmrmonitor.py said it was in (the DMRlink opcode being processed, a
+table render, ...).
+
+When the reactor comes back the stall is recorded with its full length, and
+the most recent ones are kept for the /stalls page.
+'''
+
+import sys
+import thread
+import threading
+import logging
+import traceback
+from collections import deque
+from heapq import nlargest
+from operator import itemgetter
+from time import time, sleep
+
+from twisted.internet import reactor, task
+
+# Does anybody read this stuff? There's a PEP somewhere that says I should do this.
+__author__     = 'Alex Stewart, VK2PSF'
+__copyright__  = 'Copyright (c) 2016-2019,2020 VK2PSF ,Cortney T. Buffington, N0MJS and the K0USY Group'
+__credits__    = 'Colin Durbridge, G4EML, Steve Zingman, N4IRS; Mike Zingman, N4IRR; Jonathan Naylor, G4KLX; Hans Barthen, DL5DI; Torsten Shultze, DG1HT'
+__license__    = 'GNU GPLv3'
+__maintainer__ = 'Alex Stewart , N0MJS'
+__email__      = 'vk2psf@arrl.net'
+
+logger = logging.getLogger(__name__)
+
+
+class stall_watchdog(object):
+    def __init__(self, _threshold, _interval=0.1, _keep=100):
+        self.threshold = _threshold
+        self.interval = _interval
+        self.stalls = deque(maxlen=_keep)
+        self.count = 0
+        # What the reactor is busy with, set by the code doing it
+        self.stage = None
+        self.beat = time()
+        # (beat, stage, stack) grabbed by the watchdog thread during a stall
+        self.captured = None
+        self.running = False
+
+    # Must be called from the thread that will run the reactor
+    def start(self):
+        self.reactor_thread = thread.get_ident()
+        self.running = True
+        self.heartbeat = task.LoopingCall(self.tick)
+        self.heartbeat.start(self.interval)
+        self.watcher = threading.Thread(target=self.watch, name='watchdog')
+        self.watcher.daemon = True
+        self.watcher.start()
+        reactor.addSystemEventTrigger('before', 'shutdown', self.stop)
+
+    # Wait for the thread, left running it can wake up in the middle of the
+    # interpreter shutting down
+    def stop(self):
+        self.running = False
+        self.watcher.join(self.interval * 2)
+
+    # How far past its interval a heartbeat is, the same measure on both sides
+    # so the thread only warns about stalls the reactor will go on to record
+    def late(self, _now, _beat):
+        return _now - _beat - self.interval
+
+    # Reactor side: how late this heartbeat is, is how long the reactor was stuck
+    def tick(self):
+        _now = time()
+        _last, self.beat = self.beat, _now
+        _late = self.late(_now, _last)
+        if _late < self.threshold:
+            return
+        _captured = self.captured
+        if _captured is not None and _captured[0] == _last:
+            _stage, _stack = _captured[1], _captured[2]
+        else:
+            _stage, _stack = None, []
+        self.captured = None
+        self.count += 1
+        self.stalls.append({'TIME': _last, 'SECONDS': round(_late, 3), 'STAGE': _stage, 'STACK': _stack})
+        logger.warning('REACTOR STALL: blocked for %.3fs in %s', _late, _stage)
+
+    # Watchdog thread: catch the reactor while it is still stuck
+    def watch(self):
+        while self.running:
+            sleep(self.interval)
+            _beat = self.beat
+            _late = self.late(time(), _beat)
+            if _late < self.threshold or (self.captured is not None and self.captured[0] == _beat):
+                continue
+            _frame = sys._current_frames().get(self.reactor_thread)
+            _stack = traceback.format_stack(_frame) if _frame is not None else []
+            _stage = self.stage
+            self.captured = (_beat, _stage, _stack)
+            logger.warning('REACTOR STALL: blocked for over %.3fs in %s, reactor stack:\n%s', _late, _stage, ''.join(_stack))
+
+    # The worst of the recent stalls with their stacks, and the latest ones
+    def summary(self, _worst=10, _latest=10):
+        return {
+            'threshold': self.threshold,
+            'count': self.count,
+            'worst': nlargest(_worst, self.stalls, key=itemgetter('SECONDS')),
+            'latest': [dict(_stall, STACK=None) for _stall in list(self.stalls)[-_latest:]]
+        }